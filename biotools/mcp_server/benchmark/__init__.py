@@ -0,0 +1 @@
+"""Synthetic-data benchmark suite for the biotools MCP server."""
@@ -0,0 +1,106 @@
+"""Command line entry point: ``python -m benchmark {fixtures,run,compare}``."""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from .fixtures import make_fixtures
+from .runner import run_benchmark
+
+DEFAULT_ROOT = f"{tempfile.gettempdir()}/biotools-benchmark"
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    """Print per-workload latency ratios; returns the number of regressions."""
+    regressions = 0
+    print(f"{'workload':30s} {'p50':>10s} {'p95':>10s} {'p99':>10s} {'rate':>10s}")
+    for name, new in current["workloads"].items():
+        old = baseline["workloads"].get(name)
+        if old is None:
+            continue
+        ratios = [
+            new[key] / old[key] if old[key] else float("nan")
+            for key in ("p50_s", "p95_s", "p99_s")
+        ]
+        rate = (
+            new["throughput_per_s"] / old["throughput_per_s"]
+            if old["throughput_per_s"]
+            else float("nan")
+        )
+        flag = ""
+        if ratios[0] > threshold or ratios[1] > threshold:
+            regressions += 1
+            flag = "  regression"
+        print(
+            f"{name:30s} "
+            + " ".join(f"{ratio:9.2f}x" for ratio in ratios)
+            + f" {rate:9.2f}x{flag}"
+        )
+    print(
+        f"peak RSS: {baseline['peak_rss_mb']:.0f} MB -> {current['peak_rss_mb']:.0f} MB"
+    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Synthetic-data benchmark of the biotools MCP server.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fixtures = commands.add_parser("fixtures", help="Generate the data tree only")
+    run = commands.add_parser("run", help="Generate fixtures and run all tools")
+    for command in (fixtures, run):
+        command.add_argument("--root", default=DEFAULT_ROOT, help="Benchmark directory")
+        command.add_argument(
+            "--scale",
+            type=float,
+            default=0.05,
+            help="Fixture size relative to the real library (1 = full size)",
+        )
+    run.add_argument("--calls", type=int, default=20, help="Timed calls per tool")
+    run.add_argument("--concurrency", type=int, default=4, help="Concurrent calls")
+    run.add_argument(
+        "--tools", nargs="*", help="Only these workloads or tools (default: all)"
+    )
+    run.add_argument("--output", default="benchmark.json", help="Result JSON path")
+
+    comparison = commands.add_parser("compare", help="Compare two result files")
+    comparison.add_argument("baseline")
+    comparison.add_argument("current")
+    comparison.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="p50/p95 ratio above which a workload counts as a regression",
+    )
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf8") as file:
+            baseline = json.load(file)
+        with open(args.current, "r", encoding="utf8") as file:
+            current = json.load(file)
+        raise SystemExit(1 if compare(baseline, current, args.threshold) else 0)
+
+    data_dir = f"{args.root}/data"
+    spec = make_fixtures(data_dir, args.scale)
+    print(f"Fixtures ready in {data_dir}")
+    if args.command == "fixtures":
+        return
+    # A fresh tmp directory per run, so stores and caches start cold.
+    tmp_dir = tempfile.mkdtemp(prefix="run-", dir=args.root)
+    report = asyncio.run(
+        run_benchmark(spec, data_dir, tmp_dir, args.calls, args.concurrency, args.tools)
+    )
+    report["tmp_dir"] = os.path.abspath(tmp_dir)
+    with open(args.output, "w", encoding="utf8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Synthetic data tree with the layout and shapes of the biotools ``/data``.
+
+Sizes follow the real library at ``scale=1`` (about 60k genes, a TCGA
+matrix of ~11k samples over 33 cancer types, thousands of TR bed files,
+multi-million-row SNP beds and a ChIP-seq sample sheet with paired FASTQs);
+``scale`` shrinks the sample, TR, interval and read counts but keeps the
+full gene set. A ``spec.json`` is written last, so a
+complete tree for the same spec is reused instead of regenerated.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+from biocore.enrichment import HG38_CHROM_SIZES
+
+# fmt: off
+TCGA_CANCERS = [
+    "ACC", "BLCA", "BRCA", "CESC", "CHOL", "COAD", "DLBC", "ESCA", "GBM",
+    "HNSC", "KICH", "KIRC", "KIRP", "LAML", "LGG", "LIHC", "LUAD", "LUSC",
+    "MESO", "OV", "PAAD", "PCPG", "PRAD", "READ", "SARC", "SKCM", "STAD",
+    "TGCT", "THCA", "THYM", "UCEC", "UCS", "UVM",
+]
+# fmt: on
+
+KNOWN_GENES = ["TP53", "EGFR", "ESR1", "GAPDH", "MYC", "GATA4", "TBX5", "BRCA1"]
+
+# Rows (or columns) at scale=1.
+FULL_SPEC = {
+    "genes": 60000,
+    "tcga_samples": 11000,
+    "expression_columns": {
+        "cancer_TCGA": len(TCGA_CANCERS),
+        "cell_line_CCLE": 1000,
+        "cell_line_ENCODE": 120,
+        "normal_tissue_GTEx": 54,
+        "primary_cell_ENCODE": 80,
+    },
+    "annotation_rows": {
+        "Super_Enhancer_SEdbv2": 1_000_000,
+        "Super_Enhancer_SEAv3": 300_000,
+        "Super_Enhancer_dbSUPER": 70_000,
+        "Enhancer": 2_000_000,
+        "Common_SNP": 10_000_000,
+        "Risk_SNP": 2_000_000,
+        "eQTL": 3_000_000,
+        "TFBS": 5_000_000,
+        "eRNA": 300_000,
+        "RNA_Interaction": 500_000,
+        "CRISPR": 100_000,
+    },
+    "tr_beds": 4000,
+    "tr_peaks": 20000,
+    # Read pairs of each ChIP-seq sample.
+    "chipseq_reads": 1_000_000,
+}
+# ChIP-seq samples of the sample sheet and their controls.
+CHIPSEQ_SAMPLES = {"chip1": "input", "chip2": "input", "input": ""}
+READ_LENGTH = 100
+
+
+def fixture_spec(scale: float) -> dict:
+    def scaled(n):
+        return max(int(n * scale), 1)
+
+    columns = FULL_SPEC["expression_columns"]
+    return {
+        "scale": scale,
+        "genes": FULL_SPEC["genes"],
+        "tcga_samples": max(scaled(FULL_SPEC["tcga_samples"]), len(TCGA_CANCERS)),
+        "expression_columns": {
+            # The per-cancer means always have one column per cancer type.
+            source: n if source == "cancer_TCGA" else scaled(n)
+            for source, n in columns.items()
+        },
+        "annotation_rows": {
+            key: scaled(n) for key, n in FULL_SPEC["annotation_rows"].items()
+        },
+        "tr_beds": scaled(FULL_SPEC["tr_beds"]),
+        "tr_peaks": scaled(FULL_SPEC["tr_peaks"]),
+        "chipseq_reads": scaled(FULL_SPEC["chipseq_reads"]),
+    }
+
+
+def random_intervals(rng, n: int, min_length: int, max_length: int) -> tuple:
+    """Sorted random intervals placed proportionally to chromosome size."""
+    names = np.array(list(HG38_CHROM_SIZES))
+    sizes = np.array(list(HG38_CHROM_SIZES.values()), dtype=np.int64)
+    chrom_ids = np.sort(rng.choice(len(names), n, p=sizes / sizes.sum()))
+    lengths = rng.integers(min_length, max_length + 1, n)
+    starts = rng.integers(0, np.maximum(sizes[chrom_ids] - lengths, 1))
+    order = np.lexsort((starts, chrom_ids))
+    chrom_ids, starts, lengths = chrom_ids[order], starts[order], lengths[order]
+    chroms = pa.DictionaryArray.from_arrays(pa.array(chrom_ids, pa.int32()), names)
+    return chroms.cast(pa.string()), starts, starts + lengths
+
+
+def write_bed(path: str, columns: dict):
+    pa_csv.write_csv(
+        pa.table(columns),
+        path,
+        write_options=pa_csv.WriteOptions(
+            include_header=False, delimiter="\t", quoting_style="none"
+        ),
+    )
+
+
+def write_fastq(path: str, rng, reads: int, mate: int):
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+    quality = "I" * READ_LENGTH
+    with open(path, "w", encoding="ascii") as file:
+        for start in range(0, reads, 10_000):
+            n = min(10_000, reads - start)
+            sequences = bases[rng.integers(0, 4, (n, READ_LENGTH))]
+            for i, sequence in enumerate(sequences, start):
+                text = sequence.tobytes().decode()
+                file.write(f"@read{i}/{mate}\n{text}\n+\n{quality}\n")
+
+
+def gene_symbols(n: int) -> list:
+    return KNOWN_GENES + [f"GENE{i:05d}" for i in range(n - len(KNOWN_GENES))]
+
+
+def tr_name(i: int) -> str:
+    tf = KNOWN_GENES[i] if i < len(KNOWN_GENES) else f"TF{i:04d}"
+    return f"{tf}@Sample_{i // 1000:02d}_{i:04d}"
+
+
+def make_fixtures(root: str, scale: float = 0.05, seed: int = 0) -> dict:
+    """Generate the data tree under ``root`` unless it already matches.
+
+    Returns:
+        The fixture spec, including the gene and TR names used.
+    """
+    spec = fixture_spec(scale)
+    spec_path = f"{root}/spec.json"
+    if os.path.exists(spec_path):
+        with open(spec_path, "r", encoding="utf8") as file:
+            existing = json.load(file)
+        if {key: existing.get(key) for key in spec} == spec:
+            return existing
+    rng = np.random.default_rng(seed)
+    for sub in ("human", "exp", "trapt/TR_bed", "chipseq"):
+        os.makedirs(f"{root}/{sub}", exist_ok=True)
+
+    genes = gene_symbols(spec["genes"])
+    chroms, starts, ends = random_intervals(rng, len(genes), 1000, 200_000)
+    gene_order = rng.permutation(len(genes))
+    write_bed(
+        f"{root}/human/gene.bed",
+        {
+            "chrom": chroms,
+            "start": starts,
+            "end": ends,
+            "id": [f"ENSG{i:011d}" for i in range(len(genes))],
+            "symbol": [genes[i] for i in gene_order],
+            "strand": rng.choice(["+", "-"], len(genes)),
+        },
+    )
+
+    for key, rows in spec["annotation_rows"].items():
+        # SNPs are single bases; other annotations span up to tens of kb.
+        length = (1, 1) if "SNP" in key or key == "eQTL" else (100, 20_000)
+        chroms, starts, ends = random_intervals(rng, rows, *length)
+        write_bed(
+            f"{root}/human/human_{key}.bed",
+            {
+                "chrom": chroms,
+                "start": starts,
+                "end": ends,
+                "name": pc.utf8_replace_slice(
+                    pa.array(np.arange(rows)).cast(pa.string()), 0, 0, f"{key}_"
+                ),
+            },
+        )
+
+    samples = spec["tcga_samples"]
+    cancers = np.resize(TCGA_CANCERS, samples)
+    columns = [f"{cancer}-{i:05d}" for i, cancer in enumerate(cancers)]
+    values = rng.gamma(1.0, 4.0, (len(genes), samples))
+    tcga = pd.DataFrame(values, index=pd.Index(genes, name="gene"), columns=columns)
+    tcga.to_feather(f"{root}/exp/gene_expression_TCGA.feather")
+    del tcga, values
+
+    for source, n in spec["expression_columns"].items():
+        if source == "cancer_TCGA":
+            names = TCGA_CANCERS
+        else:
+            names = [f"{source}_{i:04d}" for i in range(n)]
+        frame = pd.DataFrame(
+            rng.gamma(1.0, 4.0, (len(genes), len(names))), index=genes, columns=names
+        )
+        frame.to_csv(f"{root}/exp/{source}.csv.gz")
+
+    trs = [tr_name(i) for i in range(spec["tr_beds"])]
+    for tr in trs:
+        chroms, starts, ends = random_intervals(rng, spec["tr_peaks"], 200, 2000)
+        write_bed(
+            f"{root}/trapt/TR_bed/{tr}.bed",
+            {"chrom": chroms, "start": starts, "end": ends},
+        )
+
+    sheet = []
+    for sample, control in CHIPSEQ_SAMPLES.items():
+        for mate in (1, 2):
+            path = f"{root}/chipseq/{sample}_{mate}.fq"
+            write_fastq(path, rng, spec["chipseq_reads"], mate)
+        sheet.append([sample, f"{sample}_1.fq", f"{sample}_2.fq", control])
+    pd.DataFrame(sheet, columns=["sample", "fastq_1", "fastq_2", "control"]).to_csv(
+        f"{root}/chipseq/samples.csv", index=False
+    )
+
+    spec = {**spec, "gene_names": genes, "trs": trs}
+    with open(spec_path, "w", encoding="utf8") as file:
+        json.dump(spec, file)
+    return spec
@@ -0,0 +1,367 @@
+"""Drive every biotools tool through an in-process fastmcp client.
+
+Each workload is one tool with an argument generator. It gets one warm-up
+call (reported separately, it includes index and store builds) and then
+``calls`` timed calls issued at ``concurrency``. Arguments are drawn at
+random from the fixture genes, TRs and regions, so most calls miss the
+result cache as distinct user requests would. A call counts as an error
+unless its output looks like the tool's successful result and every output
+file it names exists.
+"""
+
+import asyncio
+import importlib
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .fixtures import HG38_CHROM_SIZES, TCGA_CANCERS
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BIOLOGICAL_TYPES = [
+    "Super_Enhancer_SEdbv2",
+    "Super_Enhancer_SEAv3",
+    "Super_Enhancer_dbSUPER",
+    "Enhancer",
+    "Common_SNP",
+    "Risk_SNP",
+    "eQTL",
+    "TFBS",
+    "eRNA",
+    "RNA_Interaction",
+    "CRISPR",
+]
+DATA_SOURCES = [
+    "cancer_TCGA",
+    "cell_line_CCLE",
+    "cell_line_ENCODE",
+    "normal_tissue_GTEx",
+    "primary_cell_ENCODE",
+]
+# How a successful result of each tool starts. Tools report most failures as
+# plain text rather than as MCP errors, so any other output counts as one.
+SUCCESS = {
+    "execute_bash": r"benchmark",
+    "execute_code": r"Snippet finished\n",
+    "submit_job": r"Job \w+ submitted",
+    "job_status": r"Job \w+: ",
+    "job_output": r"Job \w+: ",
+    "cancel_job": r"Job \w+ (cancelled|already finished)",
+    "preview_file": r"File: ",
+    "get_annotation_bed": r"/",
+    "query_annotation_bed": r"\d+ of \d+ regions overlap|\d+ overlaps between|Nearest ",
+    "annotation_enrichment": r"\d+ query regions\n",
+    "get_regulators_bed": r"output (bed files?|manifest file):\n/",
+    "regulator_overlap": r"\d+ of \d+ TRs overlap",
+    "get_gene_position": r"/",
+    "get_tcga_cancer_express": r"/",
+    "expression_summary": r"Top \d+ genes",
+    "coexpression": r"Top \d+ ",
+    "get_mean_express_data": r"/",
+    "run_chipseq_pipeline": r"Pipeline in \S+: \d+ stages queued, \d+ cached\n",
+    "pipeline_status": r"\S+\t\S+\t(cached|done|queued|running)",
+}
+# Output files named in a result, which must exist.
+OUTPUT_PATH = re.compile(r"^(/\S+)$|full result: (\S+)$", re.MULTILINE)
+
+
+def random_regions(rng: random.Random, n: int, length: int = 5000) -> list:
+    chroms = rng.choices(list(HG38_CHROM_SIZES)[:24], k=n)
+    regions = []
+    for chrom in chroms:
+        start = rng.randrange(0, HG38_CHROM_SIZES[chrom] - length)
+        regions.append(f"{chrom}:{start}-{start + length}")
+    return regions
+
+
+def workloads(spec: dict, data_dir: str, job_ids: list, pipeline_dir: str) -> list:
+    """(name, tool, argument generator) for every tool of the server."""
+    genes, trs = spec["gene_names"], spec["trs"]
+    enhancers = spec["annotation_rows"]["Enhancer"]
+    modes = ["link", "manifest", "merged"]
+    queries = ["count", "overlap", "nearest"]
+    return [
+        ("execute_bash", "execute_bash", lambda r, i: {"command": "echo benchmark"}),
+        (
+            "execute_code",
+            "execute_code",
+            lambda r, i: {"language": "python", "code": "print(sum(range(1000)))"},
+        ),
+        (
+            "submit_job",
+            "submit_job",
+            lambda r, i: {"command": "true", "cpus": 1, "memory_gb": 0.1},
+        ),
+        ("job_status", "job_status", lambda r, i: {}),
+        (
+            "job_output",
+            "job_output",
+            lambda r, i: {"job_id": job_ids[i % len(job_ids)]},
+        ),
+        (
+            "cancel_job",
+            "cancel_job",
+            lambda r, i: {"job_id": job_ids[i % len(job_ids)]},
+        ),
+        (
+            "run_chipseq_pipeline",
+            "run_chipseq_pipeline",
+            lambda r, i: {
+                "sample_sheet": f"{data_dir}/chipseq/samples.csv",
+                "output_dir": pipeline_dir,
+                "priority": -100,
+            },
+        ),
+        (
+            "pipeline_status",
+            "pipeline_status",
+            lambda r, i: {"output_dir": pipeline_dir},
+        ),
+        (
+            "preview_file",
+            "preview_file",
+            lambda r, i: {
+                "path": f"{data_dir}/human/human_Enhancer.bed",
+                "offset": r.randrange(enhancers),
+                "rows": 50,
+            },
+        ),
+        (
+            "get_annotation_bed",
+            "get_annotation_bed",
+            lambda r, i: {"biological_type": r.choice(BIOLOGICAL_TYPES)},
+        ),
+        (
+            "query_annotation_bed",
+            "query_annotation_bed",
+            lambda r, i: {
+                "regions": random_regions(r, 200),
+                "biological_type": r.choice(BIOLOGICAL_TYPES),
+                "query": queries[i % len(queries)],
+            },
+        ),
+        (
+            "annotation_enrichment",
+            "annotation_enrichment",
+            lambda r, i: {"regions": random_regions(r, 200), "shuffles": 10},
+        ),
+        (
+            "get_regulators_bed",
+            "get_regulators_bed",
+            lambda r, i: {
+                "trs": r.sample(trs, min(20, len(trs))),
+                "mode": modes[i % 3],
+            },
+        ),
+        (
+            "regulator_overlap",
+            "regulator_overlap",
+            lambda r, i: {"regions": random_regions(r, 200), "trs": "all"},
+        ),
+        (
+            "get_gene_position",
+            "get_gene_position",
+            lambda r, i: {"genes": r.sample(genes, 50)},
+        ),
+        ("get_gene_position[all]", "get_gene_position", lambda r, i: {"genes": "all"}),
+        (
+            "get_tcga_cancer_express",
+            "get_tcga_cancer_express",
+            lambda r, i: {
+                "cancer": r.choice(TCGA_CANCERS),
+                "genes": r.sample(genes, 50),
+            },
+        ),
+        (
+            "get_tcga_cancer_express[all]",
+            "get_tcga_cancer_express",
+            lambda r, i: {"cancer": r.choice(TCGA_CANCERS), "genes": "all"},
+        ),
+        (
+            "get_tcga_cancer_express[all,feather]",
+            "get_tcga_cancer_express",
+            lambda r, i: {
+                "cancer": r.choice(TCGA_CANCERS),
+                "genes": "all",
+                "output_format": "feather",
+            },
+        ),
+        (
+            "expression_summary",
+            "expression_summary",
+            lambda r, i: {
+                "group": r.choice(TCGA_CANCERS + DATA_SOURCES),
+                "query": "top",
+                "k": 50,
+            },
+        ),
+        (
+            "coexpression",
+            "coexpression",
+            lambda r, i: {
+                "genes": r.sample(genes, 5),
+                "group": r.choice(TCGA_CANCERS + DATA_SOURCES),
+                "k": 20,
+            },
+        ),
+        (
+            "get_mean_express_data",
+            "get_mean_express_data",
+            lambda r, i: {
+                "data_source": r.choice(DATA_SOURCES),
+                "genes": r.sample(genes, 50),
+            },
+        ),
+        (
+            "get_mean_express_data[all]",
+            "get_mean_express_data",
+            lambda r, i: {"data_source": r.choice(DATA_SOURCES), "genes": "all"},
+        ),
+    ]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its reaped children."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(usage, children) / 1024
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=SERVER_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def import_server(data_dir: str, tmp_dir: str):
+    """Import server.py against the fixture tree instead of /data."""
+    os.environ["BIOTOOLS_DATA_DIR"] = data_dir
+    os.environ["BIOTOOLS_TMP_DIR"] = tmp_dir
+    os.environ["BIOTOOLS_APP_DIR"] = SERVER_DIR
+    os.makedirs(tmp_dir, exist_ok=True)
+    if SERVER_DIR not in sys.path:
+        sys.path.insert(0, SERVER_DIR)
+    return importlib.import_module("server")
+
+
+def failed(tool: str, result) -> bool:
+    """Whether a call failed, as an MCP error or with a failure message."""
+    if result.is_error:
+        return True
+    text = "".join(getattr(block, "text", "") for block in result.content)
+    if not re.match(SUCCESS[tool], text):
+        return True
+    paths = [line or named for line, named in OUTPUT_PATH.findall(text)]
+    return not all(os.path.exists(path) for path in paths)
+
+
+async def run_workload(client, tool: str, make_args, calls: int, concurrency: int):
+    rng = random.Random(0)
+    args = [make_args(rng, i) for i in range(calls + 1)]
+    start = time.perf_counter()
+    warmup = await client.call_tool(tool, args[0], raise_on_error=False)
+    first_call = time.perf_counter() - start
+    latencies, errors = [], int(failed(tool, warmup))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(arguments):
+        nonlocal errors
+        async with semaphore:
+            begin = time.perf_counter()
+            result = await client.call_tool(tool, arguments, raise_on_error=False)
+            latencies.append(time.perf_counter() - begin)
+            errors += int(failed(tool, result))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[call(arguments) for arguments in args[1:]])
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else [0] * 3
+    return {
+        "tool": tool,
+        "calls": calls,
+        "concurrency": concurrency,
+        "errors": errors,
+        "first_call_s": first_call,
+        "mean_s": float(np.mean(latencies)) if latencies else 0.0,
+        "p50_s": float(p50),
+        "p95_s": float(p95),
+        "p99_s": float(p99),
+        "throughput_per_s": calls / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_benchmark(
+    spec: dict,
+    data_dir: str,
+    tmp_dir: str,
+    calls: int = 20,
+    concurrency: int = 4,
+    only: list | None = None,
+    log=print,
+) -> dict:
+    from fastmcp import Client
+
+    start = time.perf_counter()
+    server = import_server(data_dir, tmp_dir)
+    import_s = time.perf_counter() - start
+    # Jobs for job_output/cancel_job; the scheduler thread is not started,
+    # so they stay queued and nothing is executed.
+    job_ids = [
+        server.job_scheduler.submit("sleep 600", priority=-100)
+        for _ in range(calls + 1)
+    ]
+    # A pipeline run for pipeline_status; its stages stay queued as well.
+    pipeline_dir = f"{tmp_dir}/chipseq"
+    server.chipseq_pipeline.submit(
+        f"{data_dir}/chipseq/samples.csv", pipeline_dir, priority=-100
+    )
+    start = time.perf_counter()
+    server.tr_library.build()
+    tr_library_s = time.perf_counter() - start
+
+    results = {}
+    async with Client(server.mcp) as client:
+        for name, tool, make_args in workloads(spec, data_dir, job_ids, pipeline_dir):
+            if only and name not in only and tool not in only:
+                continue
+            results[name] = await run_workload(
+                client, tool, make_args, calls, concurrency
+            )
+            log(
+                f"{name:30s} p50 {results[name]['p50_s'] * 1000:9.1f} ms  "
+                f"p99 {results[name]['p99_s'] * 1000:9.1f} ms  "
+                f"{results[name]['throughput_per_s']:8.1f}/s  "
+                f"errors {results[name]['errors']}"
+            )
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "fixtures": {
+            key: value
+            for key, value in spec.items()
+            if key not in ("gene_names", "trs")
+        },
+        "calls": calls,
+        "concurrency": concurrency,
+        "server_import_s": import_s,
+        "tr_library_build_s": tr_library_s,
+        "peak_rss_mb": peak_rss_mb(),
+        "workloads": results,
+    }
@@ -0,0 +1,81 @@
+"""Data access layer shared by the biotools MCP server tools."""
+
+from .cache import ResultCache, atomic_output, normalize_genes
+from .catalog import Catalog
+from .coexpression import top_correlated
+from .compact import compact_frame, compact_table, expand_frame, expand_table
+from .enrichment import category_enrichment
+from .formats import (
+    OUTPUT_FORMATS,
+    resolve_format,
+    write_csv,
+    write_frame,
+    write_frames,
+)
+from .genes import GeneIndex, GeneTable
+from .interpreters import InterpreterPool
+from .intervals import IntervalIndex, IntervalStore, read_bed_table, read_regions
+from .jobs import JobScheduler, tail_file, total_memory_gb
+from .materialize import materialize_dir, materialize_manifest
+from .offload import BlockingPool, PoolBusy
+from .pipeline import ChipSeqPipeline, read_sample_sheet
+from .preview import FilePreview
+from .process import LineTail, stream_output
+from .store import (
+    ExpressionMatrix,
+    ExpressionStore,
+    PartitionedMatrix,
+    prune_versions,
+)
+from .summary import ExpressionSummary, SummaryStore
+from .trlibrary import TRLibrary, TRLibraryStore, build_tr_library
+from .watcher import CatalogWatcher
+from .workers import serve_workers
+
+__all__ = [
+    "BlockingPool",
+    "Catalog",
+    "CatalogWatcher",
+    "ChipSeqPipeline",
+    "ExpressionMatrix",
+    "ExpressionStore",
+    "ExpressionSummary",
+    "FilePreview",
+    "GeneIndex",
+    "GeneTable",
+    "InterpreterPool",
+    "IntervalIndex",
+    "IntervalStore",
+    "JobScheduler",
+    "LineTail",
+    "OUTPUT_FORMATS",
+    "PartitionedMatrix",
+    "PoolBusy",
+    "ResultCache",
+    "SummaryStore",
+    "TRLibrary",
+    "TRLibraryStore",
+    "atomic_output",
+    "build_tr_library",
+    "category_enrichment",
+    "compact_frame",
+    "compact_table",
+    "expand_frame",
+    "expand_table",
+    "materialize_dir",
+    "materialize_manifest",
+    "normalize_genes",
+    "prune_versions",
+    "read_bed_table",
+    "read_regions",
+    "read_sample_sheet",
+    "resolve_format",
+    "serve_workers",
+    "stream_output",
+    "tail_file",
+    "top_correlated",
+    "total_memory_gb",
+    "write_csv",
+    "write_frame",
+    "write_frames",
+]
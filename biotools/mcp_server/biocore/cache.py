@@ -0,0 +1,257 @@
+"""Content-addressed cache of tool output files with LRU eviction.
+
+Output files are named after a key derived from the tool name, the version
+of the data it read and its normalized arguments, so an identical request
+maps to the same file. Finished outputs are registered in a small SQLite
+index together with their size and last use; a background thread evicts the
+least recently used ones when the total exceeds the disk budget.
+
+``produce`` runs the computation of a missing output once per key:
+identical concurrent calls, from other threads or other server workers,
+wait for the running one and return its file. Outputs are written under a
+temporary name and renamed into place, so a file at a cache path is always
+complete.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from .metrics import record_cache, record_coalesced, record_write
+
+
+def normalize_genes(genes):
+    """Gene arguments as an order-insensitive cache key component."""
+    if isinstance(genes, str):
+        return genes
+    return sorted(set(genes), key=str)
+
+
+@contextlib.contextmanager
+def atomic_output(path: str):
+    """Yield a temporary path next to ``path``; it is renamed to ``path``
+    when the block succeeds and removed otherwise."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+
+
+class Flight:
+    """One running computation that identical calls wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.path = None
+        self.error = None
+
+    def wait(self) -> str:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.path
+
+
+def path_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(
+            entry.stat(follow_symlinks=False).st_size for entry in os.scandir(path)
+        )
+    return os.path.getsize(path)
+
+
+class ResultCache:
+    """Registry of tool output files bounded by a disk budget.
+
+    Args:
+        db_path: Path of the SQLite index.
+        budget_bytes: Total size of registered outputs to keep.
+        interval: Seconds between background eviction passes.
+    """
+
+    def __init__(self, db_path: str, budget_bytes: int, interval: float = 60.0):
+        self.db_path = db_path
+        self.budget_bytes = budget_bytes
+        self.interval = interval
+        self.lock_dir = f"{os.path.dirname(db_path)}/locks"
+        self._thread = None
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, path TEXT, size INTEGER, last_used REAL)"
+            )
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(tool: str, version, **args) -> str:
+        payload = json.dumps(
+            {"tool": tool, "version": version, "args": args},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+    @contextlib.contextmanager
+    def _lock(self, key: str, blocking: bool = True):
+        """Hold the cross-process lock of a key; yields False instead of
+        waiting when ``blocking`` is off and another process holds it.
+
+        Eviction unlinks lock files while holding them, so a lock taken on a
+        file that has meanwhile been unlinked is dropped and taken again.
+        """
+        path = f"{self.lock_dir}/{key}.lock"
+        while True:
+            with open(path, "a") as lock:
+                try:
+                    fcntl.flock(
+                        lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+                    )
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    current = os.stat(path).st_ino == os.fstat(lock.fileno()).st_ino
+                except FileNotFoundError:
+                    current = False
+                if current:
+                    yield True
+                    return
+
+    def _find(self, key: str) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT path FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            return row[0]
+
+    def lookup(self, key: str) -> str | None:
+        """The registered output for a key, or None if it is missing."""
+        path = self._find(key)
+        record_cache("result", path is not None)
+        return path
+
+    def produce(self, key: str, build) -> str:
+        """The output for a key, calling ``build()`` to create it if missing.
+
+        Only one ``build`` per key runs at a time across threads and server
+        processes; identical calls arriving meanwhile wait for it and return
+        the same path (or raise the same error).
+
+        Args:
+            key: Cache key of the output.
+            build: Callable writing the output and returning its path.
+        """
+        path = self.lookup(key)
+        if path:
+            return path
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            record_coalesced()
+            return flight.wait()
+        try:
+            # Another worker process may be building the same output.
+            with self._lock(key):
+                flight.path = self._find(key)
+                if flight.path:
+                    record_coalesced()
+                else:
+                    flight.path = self.store(key, build())
+            return flight.path
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def store(self, key: str, path: str) -> str:
+        """Register a finished output file or directory."""
+        size = path_size(path)
+        record_write(size)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, path, size, time.time()),
+            )
+        return path
+
+    def evict(self) -> int:
+        """Remove least recently used outputs beyond the budget.
+
+        Returns:
+            The number of bytes freed.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, path, size FROM results ORDER BY last_used DESC"
+            ).fetchall()
+            total, evicted = 0, []
+            for key, path, size in rows:
+                total += size
+                if total > self.budget_bytes:
+                    evicted.append((key, path, size))
+            for key, path, _ in evicted:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        freed = 0
+        for key, path, size in evicted:
+            # A key being rebuilt keeps its lock file; it is removed with the
+            # key's next eviction.
+            with self._lock(key, blocking=False) as locked:
+                if locked:
+                    os.remove(f"{self.lock_dir}/{key}.lock")
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+            freed += size
+        return freed
+
+    def start(self):
+        """Run eviction in a background daemon thread."""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.evict()
+                except Exception as e:
+                    print(f"Result cache eviction failed: {e}")
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=run, name="result-cache", daemon=True)
+        self._thread.start()
@@ -0,0 +1,297 @@
+"""Manifest-backed catalog of the biotools data tree.
+
+The manifest records, for every tracked data file, its size, mtime, md5
+checksum and (for expression tables) its column names, plus an index of the
+TRAPT ``TR_bed`` directory. It is written once and reloaded at startup, so the
+server no longer parses expression tables or lists the TR directory on import.
+
+A running server picks up data changes in two steps: ``stage`` re-indexes
+the tree into a copy of the catalog, the stores derived from the changed
+entries are built for that copy, and ``publish`` then switches the live
+catalog to it at once. Requests see either the old or the new versions,
+never a version whose stores are still being built.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+MANIFEST_VERSION = 1
+
+
+def file_checksum(path: str, chunk_size: int = 1 << 20) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def read_checked(path: str, checksum: str, reader):
+    """``reader(path)``, provided the file still has the given checksum.
+
+    Derived stores are keyed by the checksum in the catalog, so a file that
+    changed since it was indexed must not be converted under the old key.
+
+    Raises:
+        ValueError: The file no longer matches ``checksum``.
+    """
+    before = os.stat(path)
+    if file_checksum(path) == checksum:
+        data = reader(path)
+        after = os.stat(path)
+        if (after.st_size, after.st_mtime_ns) == (before.st_size, before.st_mtime_ns):
+            return data
+    raise ValueError(
+        f"{path} changed since it was indexed; retry after the catalog refreshes"
+    )
+
+
+def read_columns(path: str) -> list | None:
+    """Read the column names of an expression table without loading its body."""
+    if path.endswith(".feather"):
+        with pa.memory_map(path) as source:
+            schema = pa.ipc.open_file(source).schema
+        index_columns = (schema.pandas_metadata or {}).get("index_columns", [])
+        return [name for name in schema.names if name not in index_columns]
+    if ".csv" in path:
+        return pd.read_csv(path, index_col=0, nrows=0).columns.to_list()
+    return None
+
+
+class Catalog:
+    """Tracks data files and the TR bed directory through an on-disk manifest.
+
+    Args:
+        manifest_path: Where the manifest JSON is stored (must be writable).
+        files: Mapping of catalog key to data file path.
+        tr_dir: Directory holding the TRAPT per-sample TR bed files.
+    """
+
+    def __init__(self, manifest_path: str, files: dict, tr_dir: str):
+        self.manifest_path = manifest_path
+        self.files = dict(files)
+        self.tr_dir = tr_dir
+        self._lock = threading.RLock()
+        self._loaded = {}
+        self._tr_data_db = (None, {})
+        self._manifest_mtime = None
+        self._manifest = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf8") as file:
+                self._manifest_mtime = os.fstat(file.fileno()).st_mtime_ns
+                manifest = json.load(file)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"version": MANIFEST_VERSION, "files": {}, "tr": None}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(self._manifest, file)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def _refresh_file(self, key: str, path: str) -> str:
+        """Re-index one file if it changed. Returns 'changed', 'touched' or ''."""
+        entries = self._manifest["files"]
+        entry = entries.get(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if entries.pop(key, None) is not None:
+                return "changed"
+            return ""
+        if (
+            entry
+            and entry["path"] == path
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return ""
+        checksum = file_checksum(path)
+        if entry and entry["path"] == path and entry["checksum"] == checksum:
+            # Touched but unchanged: keep the derived data, update the stat.
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            return "touched"
+        entries[key] = {
+            "path": path,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "checksum": checksum,
+            "columns": read_columns(path),
+        }
+        return "changed"
+
+    def _refresh_tr(self, deep: bool = False) -> bool:
+        """Re-list the TR directory when its mtime changed. A bed rewritten
+        in place leaves the directory mtime alone, so a ``deep`` refresh
+        compares every entry's size and mtime regardless."""
+        try:
+            mtime_ns = os.stat(self.tr_dir).st_mtime_ns
+            tr = self._manifest["tr"]
+            if (
+                not deep
+                and tr
+                and tr["dir"] == self.tr_dir
+                and tr.get("mtime_ns") == mtime_ns
+            ):
+                return False
+            files = {}
+            with os.scandir(self.tr_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name.split(".")[0]] = [
+                            entry.name,
+                            stat.st_size,
+                            stat.st_mtime_ns,
+                        ]
+        except FileNotFoundError:
+            changed = self._manifest["tr"] is not None
+            self._manifest["tr"] = None
+            return changed
+        if tr and tr["dir"] == self.tr_dir and tr["files"] == files:
+            tr["mtime_ns"] = mtime_ns
+            return False
+        listing = json.dumps([self.tr_dir, files], sort_keys=True)
+        self._manifest["tr"] = {
+            "dir": self.tr_dir,
+            "mtime_ns": mtime_ns,
+            "version": hashlib.md5(listing.encode("utf-8")).hexdigest(),
+            "files": files,
+        }
+        return True
+
+    def refresh(self, save: bool = True, deep: bool = False) -> list:
+        """Bring the manifest up to date, re-indexing only stale entries.
+
+        Args:
+            save: Write the updated manifest to disk.
+            deep: Stat every TR bed, not only the TR directory.
+
+        Returns:
+            The catalog keys whose content changed ("tr_bed" for the TR index).
+        """
+        with self._lock:
+            changed, dirty = [], False
+            for key in set(self._manifest["files"]) - set(self.files):
+                del self._manifest["files"][key]
+                dirty = True
+            for key, path in self.files.items():
+                status = self._refresh_file(key, path)
+                if status == "changed":
+                    changed.append(key)
+                    self._loaded.pop(key, None)
+                dirty = dirty or bool(status)
+            if self._refresh_tr(deep):
+                changed.append("tr_bed")
+            if save and (dirty or changed):
+                self._save()
+            return changed
+
+    def stage(self, refresh: bool = True) -> tuple:
+        """An up-to-date copy of the catalog and the keys that changed in it.
+
+        The catalog itself keeps serving the current versions until the copy
+        is passed to ``publish``. The refresh is deep, so TR beds rewritten
+        in place are picked up. Without ``refresh`` the copy is a snapshot of
+        the current versions and no keys are reported.
+        """
+        with self._lock:
+            stage = copy.copy(self)
+            stage._lock = threading.RLock()
+            stage._loaded = {}
+            stage._tr_data_db = (None, {})
+            stage._manifest = copy.deepcopy(self._manifest)
+        return stage, stage.refresh(save=False, deep=True) if refresh else []
+
+    def publish(self, stage: "Catalog") -> bool:
+        """Switch to the manifest of a staged catalog and save it.
+
+        Returns:
+            False if the staged manifest is identical to the current one.
+        """
+        with self._lock:
+            if stage._manifest == self._manifest:
+                return False
+            self._manifest = stage._manifest
+            self._save()
+            return True
+
+    def reload(self) -> bool:
+        """Switch to the manifest on disk if another process published a newer
+        one. Returns whether it changed."""
+        with self._lock:
+            try:
+                if os.stat(self.manifest_path).st_mtime_ns == self._manifest_mtime:
+                    return False
+                with open(self.manifest_path, "r", encoding="utf8") as file:
+                    mtime = os.fstat(file.fileno()).st_mtime_ns
+                    manifest = json.load(file)
+            except (OSError, ValueError):
+                return False
+            self._manifest_mtime = mtime
+            if (
+                manifest.get("version") != MANIFEST_VERSION
+                or manifest == self._manifest
+            ):
+                return False
+            self._manifest = manifest
+            return True
+
+    def path(self, key: str) -> str | None:
+        return self.files.get(key)
+
+    def checksum(self, key: str) -> str | None:
+        entry = self._manifest["files"].get(key)
+        return entry["checksum"] if entry else None
+
+    def version(self, key: str) -> str | None:
+        """Version of a catalog entry: its checksum, or for the TR index a
+        hash of the name, size and mtime of every bed."""
+        if key == "tr_bed":
+            tr = self._manifest["tr"]
+            return tr["version"] if tr else None
+        return self.checksum(key)
+
+    def columns(self, key: str) -> list:
+        entry = self._manifest["files"].get(key)
+        return (entry and entry["columns"]) or []
+
+    def tr_data_db(self) -> dict:
+        """TR name -> bed path, rebuilt only when the TR index changes."""
+        tr = self._manifest["tr"]
+        cached_tr, tr_data_db = self._tr_data_db
+        if cached_tr is not tr:
+            tr_data_db = {
+                name: f"{tr['dir']}/{filename}"
+                for name, (filename, *_) in (tr["files"].items() if tr else [])
+            }
+            self._tr_data_db = (tr, tr_data_db)
+        return tr_data_db
+
+    def lazy(self, key: str, loader):
+        """Load a data file on first use and keep it until its checksum changes.
+
+        Args:
+            key: Catalog key of the file.
+            loader: Callable taking the file path and returning the loaded data.
+        """
+        with self._lock:
+            checksum = self.checksum(key)
+            cached = self._loaded.get(key)
+            if cached is None or cached[0] != checksum:
+                cached = (checksum, loader(self.files[key]))
+                self._loaded[key] = cached
+            return cached[1]
@@ -0,0 +1,106 @@
+"""Top-k co-expressed genes by blocked correlation over a mapped matrix.
+
+All query genes are standardized once and correlated against the matrix in
+row blocks: each block is standardized to float32 and multiplied with the
+query block in one matrix product, and a running top-k per query gene is
+merged with ``argpartition``. Only one block is materialized at a time, so
+memory stays bounded by ``block_bytes`` regardless of the matrix size, and
+every query gene is answered in the same pass over the data.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .metrics import record_scan
+
+METHODS = ("pearson", "spearman")
+DIRECTIONS = ("positive", "negative", "absolute")
+BLOCK_BYTES = 64 << 20
+
+
+def standardize(block: np.ndarray, method: str = "pearson") -> tuple:
+    """Rows scaled to zero mean and unit norm, so a dot product is a correlation.
+
+    Missing values are set to the row mean (zero after centering). Returns
+    the float32 rows and a mask of rows with non-zero variance.
+    """
+    block = np.asarray(block, dtype=np.float64)
+    if method == "spearman":
+        block = pd.DataFrame(block).rank(axis=1).to_numpy()
+    missing = np.isnan(block)
+    counts = np.maximum((~missing).sum(axis=1, keepdims=True), 1)
+    mean = np.where(missing, 0.0, block).sum(axis=1, keepdims=True) / counts
+    centered = np.where(missing, 0.0, block - mean)
+    norm = np.sqrt(np.einsum("ij,ij->i", centered, centered))
+    valid = norm > 0
+    centered[valid] /= norm[valid, None]
+    centered[~valid] = 0.0
+    return centered.astype(np.float32), valid
+
+
+def top_correlated(
+    values: np.ndarray,
+    query_rows: np.ndarray,
+    k: int = 20,
+    method: str = "pearson",
+    direction: str = "positive",
+    block_bytes: int = BLOCK_BYTES,
+) -> tuple:
+    """The k genes most correlated with each query gene.
+
+    Args:
+        values: genes x samples matrix (may be a read-only memory map).
+        query_rows: Row positions of the query genes.
+        k: Genes returned per query gene; the query gene itself is excluded.
+        method: "pearson" or "spearman".
+        direction: Rank by "positive" correlation, "negative" correlation
+            or "absolute" value.
+        block_bytes: Size budget of one float32 block of the matrix.
+
+    Returns:
+        Arrays of shape (queries, k): the matched rows (-1 when fewer genes
+        are available) and their correlation, ordered best first.
+    """
+    if method not in METHODS:
+        raise ValueError(
+            f"Method {method} not supported (must be: {', '.join(METHODS)})"
+        )
+    if direction not in DIRECTIONS:
+        raise ValueError(
+            f"Direction {direction} not supported (must be: {', '.join(DIRECTIONS)})"
+        )
+    query_rows = np.asarray(query_rows, dtype=np.int64)
+    genes, samples = values.shape
+    queries, _ = standardize(values[query_rows], method)
+    k = max(min(k, genes - 1), 0)
+    best_rows = np.full((len(query_rows), k), -1, dtype=np.int64)
+    best_corr = np.zeros((len(query_rows), k), dtype=np.float32)
+    best_score = np.full((len(query_rows), k), -np.inf, dtype=np.float32)
+    if k == 0 or len(query_rows) == 0:
+        return best_rows, best_corr
+    step = max(block_bytes // max(samples * 4, 1), 1)
+    for start in range(0, genes, step):
+        block = values[start : start + step]
+        record_scan(len(block), block.nbytes)
+        block, valid = standardize(block, method)
+        corr = queries @ block.T
+        if direction == "positive":
+            score = corr.copy()
+        elif direction == "negative":
+            score = -corr
+        else:
+            score = np.abs(corr)
+        score[:, ~valid] = -np.inf
+        inside = (query_rows >= start) & (query_rows < start + len(block))
+        score[np.flatnonzero(inside), query_rows[inside] - start] = -np.inf
+        rows = np.broadcast_to(np.arange(start, start + len(block)), score.shape)
+        merged_score = np.hstack([best_score, score])
+        top = np.argpartition(-merged_score, k - 1, axis=1)[:, :k]
+        best_score = np.take_along_axis(merged_score, top, axis=1)
+        best_rows = np.take_along_axis(np.hstack([best_rows, rows]), top, axis=1)
+        best_corr = np.take_along_axis(np.hstack([best_corr, corr]), top, axis=1)
+    order = np.argsort(-best_score, axis=1, kind="stable")
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    best_corr = np.take_along_axis(best_corr, order, axis=1)
+    best_rows[np.take_along_axis(best_score, order, axis=1) == -np.inf] = -1
+    return best_rows, best_corr
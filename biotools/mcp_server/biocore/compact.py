@@ -0,0 +1,79 @@
+"""Compact in-memory representation of genomic tables.
+
+BED-like tables hold few distinct chromosome, strand and often name values,
+and coordinates well below 2**31. Repeated strings are therefore stored as
+categoricals (pandas) or dictionary arrays (Arrow), and 64-bit integer
+columns whose values fit are narrowed to int32. ``expand_frame`` and
+``expand_table`` restore the default types where results leave the server,
+so written outputs are unchanged.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+INT32 = np.iinfo(np.int32)
+# Encode a string column when its distinct values are at most this share of rows.
+CATEGORY_RATIO = 0.5
+
+
+def fits_int32(values) -> bool:
+    return len(values) == 0 or (INT32.min <= values.min() and values.max() <= INT32.max)
+
+
+def compact_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Categorical low-cardinality string columns and int32 integer columns."""
+    types = {}
+    for name, column in frame.items():
+        if column.dtype == object:
+            if column.nunique(dropna=False) <= CATEGORY_RATIO * len(column):
+                types[name] = "category"
+        elif column.dtype == np.int64 and fits_int32(column.to_numpy()):
+            types[name] = np.int32
+    return frame.astype(types) if types else frame
+
+
+def expand_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """Undo ``compact_frame``: categoricals back to values, int32 to int64."""
+    types = {}
+    for name, column in frame.items():
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            types[name] = column.cat.categories.dtype
+        elif column.dtype == np.int32:
+            types[name] = np.int64
+    return frame.astype(types) if types else frame
+
+
+def compact_table(table: pa.Table) -> pa.Table:
+    """Dictionary-encoded low-cardinality string columns and int32 integer
+    columns of an Arrow table."""
+    for number, field in enumerate(table.schema):
+        column = table.column(number)
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            distinct = pc.count_distinct(column, mode="all").as_py()
+            if distinct <= CATEGORY_RATIO * len(column):
+                column = pc.dictionary_encode(column)
+        elif pa.types.is_int64(field.type) and column.null_count == 0:
+            bounds = pc.min_max(column).as_py()
+            if bounds["min"] is None or (
+                INT32.min <= bounds["min"] and bounds["max"] <= INT32.max
+            ):
+                column = column.cast(pa.int32())
+        else:
+            continue
+        table = table.set_column(number, field.with_type(column.type), column)
+    return table
+
+
+def expand_table(table: pa.Table) -> pa.Table:
+    """Undo ``compact_table``: dictionaries back to values, int32 to int64."""
+    for number, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            column = table.column(number).cast(field.type.value_type)
+        elif pa.types.is_int32(field.type):
+            column = table.column(number).cast(pa.int64())
+        else:
+            continue
+        table = table.set_column(number, field.with_type(column.type), column)
+    return table
@@ -0,0 +1,139 @@
+"""Overlap and enrichment of one region set against annotation categories.
+
+Each category is evaluated by ``category_enrichment``, which is a plain
+top-level function so it can run in a process pool: a worker opens (or
+builds) the memory-mapped interval index itself, so only the query regions
+are sent between processes. Background expectations come from shuffling the
+regions within their chromosome; the shuffles are counted in vectorized
+batches of a bounded number of regions, so a worker's memory does not grow
+with the number of shuffles.
+"""
+
+import numpy as np
+
+from .intervals import IntervalIndex, build_index
+
+# hg38 primary assembly chromosome sizes, used to place shuffled regions.
+HG38_CHROM_SIZES = {
+    "chr1": 248956422,
+    "chr2": 242193529,
+    "chr3": 198295559,
+    "chr4": 190214555,
+    "chr5": 181538259,
+    "chr6": 170805979,
+    "chr7": 159345973,
+    "chr8": 145138636,
+    "chr9": 138394717,
+    "chr10": 133797422,
+    "chr11": 135086622,
+    "chr12": 133275309,
+    "chr13": 114364328,
+    "chr14": 107043718,
+    "chr15": 101991189,
+    "chr16": 90338345,
+    "chr17": 83257441,
+    "chr18": 80373285,
+    "chr19": 58617616,
+    "chr20": 64444167,
+    "chr21": 46709983,
+    "chr22": 50818468,
+    "chrX": 156040895,
+    "chrY": 57227415,
+    "chrM": 16569,
+}
+
+# Shuffled regions placed and counted per pass over the index.
+SHUFFLE_BATCH = 1_000_000
+
+_indexes = {}
+
+
+def open_index(
+    bed_path: str, index_dir: str, checksum: str | None = None
+) -> IntervalIndex:
+    """Open an interval index once per process, building it if needed."""
+    index = _indexes.get(index_dir)
+    if index is None:
+        built = build_index(bed_path, index_dir, checksum)
+        index = IntervalIndex(f"{built}/index.arrow")
+        _indexes[index_dir] = index
+    return index
+
+
+def shuffle_regions(
+    chroms, starts, ends, shuffles: int, seed: int, batch: int = SHUFFLE_BATCH
+):
+    """Random placements of every region on its own chromosome.
+
+    Yields:
+        Start and end arrays of shape (n, regions), ``shuffles`` rows in
+        total, with as many rows per batch as fit in ``batch`` regions (at
+        least one).
+    """
+    rng = np.random.default_rng(seed)
+    lengths = ends - starts
+    sizes = np.array(
+        [HG38_CHROM_SIZES.get(chrom, 0) for chrom in chroms], dtype=np.int64
+    )
+    # Unknown contigs: keep shuffles within the span the regions cover.
+    sizes = np.maximum(sizes, ends)
+    high = np.maximum(sizes - lengths, 1)
+    rows = max(batch // max(len(starts), 1), 1)
+    for done in range(0, shuffles, rows):
+        shuffled_starts = rng.integers(
+            0, high, size=(min(rows, shuffles - done), len(starts))
+        )
+        yield shuffled_starts, shuffled_starts + lengths
+
+
+def category_enrichment(
+    bed_path: str,
+    index_dir: str,
+    chroms: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    shuffles: int = 0,
+    seed: int = 0,
+    checksum: str | None = None,
+) -> dict:
+    """Overlap statistics of a region set against one annotation category.
+
+    Returns:
+        A dict with the number and fraction of regions overlapping the
+        category, the total overlap count and, when ``shuffles`` > 0, the
+        expected number of overlapping regions, fold enrichment and an
+        empirical p-value from the shuffled backgrounds.
+    """
+    index = open_index(bed_path, index_dir, checksum)
+    counts = index.count(chroms, starts, ends)
+    observed = int((counts > 0).sum())
+    result = {
+        "regions": observed,
+        "fraction": observed / len(counts) if len(counts) else 0.0,
+        "overlaps": int(counts.sum()),
+        "annotations": len(index),
+    }
+    if shuffles > 0:
+        # Overlapping regions of each shuffle, counted a batch at a time.
+        background = np.concatenate(
+            [
+                (
+                    index.count(
+                        np.tile(chroms, len(shuffled_starts)),
+                        shuffled_starts.ravel(),
+                        shuffled_ends.ravel(),
+                    ).reshape(shuffled_starts.shape)
+                    > 0
+                ).sum(axis=1)
+                for shuffled_starts, shuffled_ends in shuffle_regions(
+                    chroms, starts, ends, shuffles, seed
+                )
+            ]
+        )
+        expected = float(background.mean())
+        result.update(
+            expected=expected,
+            fold_enrichment=observed / expected if expected else float("inf"),
+            p_value=(1 + int((background >= observed).sum())) / (1 + shuffles),
+        )
+    return result
@@ -0,0 +1,110 @@
+"""Output file formats for tabular tool results.
+
+Tools write text by default (CSV, or BED for interval results), which keeps
+the original outputs byte for byte. Large exports can instead be written as
+Parquet (zstd), Feather/Arrow IPC (uncompressed, so readers can memory-map
+it) or gzip-compressed TSV, so the next R or Python step reads columns back
+without parsing text. Exports of whole matrices are streamed in row chunks
+with ``write_frames``.
+"""
+
+import contextlib
+import gzip
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .cache import atomic_output
+from .intervals import bed_column_names
+
+# Format name -> file extension; "text" resolves to the tool's text format.
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "bed": ".bed",
+    "tsv.gz": ".tsv.gz",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+ALIASES = {"arrow": "feather", "ipc": "feather", "tsv": "tsv.gz"}
+
+
+def resolve_format(output_format: str, text_format: str) -> str:
+    """Normalize an ``output_format`` argument for a tool writing ``text_format``."""
+    name = ALIASES.get(output_format.lower(), output_format.lower())
+    if name in ("text", "csv", "bed"):
+        return text_format
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Output format {output_format} not supported "
+            "(must be: text, tsv.gz, parquet, feather)"
+        )
+    return name
+
+
+def write_csv(frame: pd.DataFrame, path: str, **kwargs) -> str:
+    """``frame.to_csv(path, **kwargs)`` through a temporary file; returns path."""
+    with atomic_output(path) as tmp_path:
+        frame.to_csv(tmp_path, **kwargs)
+    return path
+
+
+def write_frame(
+    frame: pd.DataFrame, stem: str, output_format: str, bed: bool = False
+) -> str:
+    """Write a table as ``stem`` plus the format's extension.
+
+    The file is written under a temporary name and renamed into place.
+    Text formats follow the tool conventions: CSV keeps the index and header,
+    BED has neither. A ``bed`` frame is interval data without an index; the
+    other formats name its columns chrom, start, end, col4, ...
+
+    Returns:
+        The path of the written file.
+    """
+    return write_frames([frame], stem, output_format, bed)
+
+
+def write_frames(frames, stem: str, output_format: str, bed: bool = False) -> str:
+    """Stream a table given as consecutive row chunks, as ``write_frame``.
+
+    Each chunk is written and released before the next one is requested,
+    so memory stays bounded by the chunk size. Chunks must have the same
+    columns; an empty iterator writes nothing and raises ValueError.
+    """
+    path = f"{stem}{OUTPUT_FORMATS[output_format]}"
+    with atomic_output(path) as tmp_path, contextlib.ExitStack() as stack:
+        writer = schema = None
+        for frame in frames:
+            first = writer is None
+            if bed and output_format not in ("csv", "bed"):
+                frame = frame.set_axis(bed_column_names(frame.shape[1]), axis=1)
+            if output_format in ("csv", "bed"):
+                if first:
+                    writer = stack.enter_context(open(tmp_path, "w", newline=""))
+                if output_format == "csv":
+                    frame.to_csv(writer, header=first)
+                else:
+                    frame.to_csv(writer, header=False, index=False, sep="\t")
+            elif output_format == "tsv.gz":
+                if first:
+                    # Level 1: most of the size reduction for a fraction of the time.
+                    writer = stack.enter_context(
+                        gzip.open(tmp_path, "wt", compresslevel=1, newline="")
+                    )
+                frame.to_csv(writer, sep="\t", index=not bed, header=first)
+            else:
+                table = pa.Table.from_pandas(
+                    frame, schema=schema, preserve_index=not bed
+                )
+                if first:
+                    schema = table.schema
+                    if output_format == "parquet":
+                        writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+                    else:
+                        writer = pa.ipc.new_file(tmp_path, schema)
+                    stack.callback(writer.close)
+                writer.write_table(table)
+        if writer is None:
+            raise ValueError("No rows to write")
+    return path
@@ -0,0 +1,54 @@
+"""Hash-indexed gene symbol lookup shared by the gene and expression tools."""
+
+import numpy as np
+import pandas as pd
+
+from .compact import compact_frame, expand_frame
+
+
+class GeneIndex:
+    """Precomputed symbol-to-row index over a table's gene column.
+
+    Rows are grouped by symbol once, so resolving a gene list costs a hash
+    lookup per requested gene plus the number of matching rows, instead of a
+    scan of every row against the list.
+    """
+
+    def __init__(self, symbols):
+        codes, self.symbols = pd.factorize(pd.Index(symbols))
+        self._order = np.argsort(codes, kind="stable")
+        self._bounds = np.searchsorted(
+            codes[self._order], np.arange(len(self.symbols) + 1)
+        )
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def rows(self, genes) -> np.ndarray:
+        """Positions of all rows whose symbol is in ``genes``, in table order."""
+        codes = self.symbols.get_indexer(pd.unique(pd.Index(list(genes))))
+        codes = codes[codes >= 0]
+        if len(codes) == 0:
+            return np.empty(0, dtype=np.int64)
+        rows = np.concatenate(
+            [self._order[self._bounds[code] : self._bounds[code + 1]] for code in codes]
+        )
+        return np.sort(rows)
+
+
+class GeneTable:
+    """A data frame together with the GeneIndex of one of its columns.
+
+    The frame is held in compact form (see ``compact_frame``); ``select``
+    and ``table`` return the default dtypes.
+    """
+
+    def __init__(self, frame: pd.DataFrame, column):
+        self.frame = compact_frame(frame)
+        self.genes = GeneIndex(frame[column])
+
+    def select(self, genes) -> pd.DataFrame:
+        return expand_frame(self.frame.iloc[self.genes.rows(genes)])
+
+    def table(self) -> pd.DataFrame:
+        return expand_frame(self.frame)
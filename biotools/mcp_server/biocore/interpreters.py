@@ -0,0 +1,430 @@
+"""Warm R and Python interpreters for analysis snippets.
+
+Loading ChIPseeker and a TxDb, or pandas, takes seconds; running
+every snippet as a fresh ``Rscript -e`` pays that on each call. A pool keeps
+long-lived interpreters that have loaded the common libraries once. Each
+snippet runs in a child forked from a warm interpreter: it starts with the
+libraries already in memory (shared copy-on-write), while its variables,
+working directory, options and memory stay in the child and are gone when
+it exits, so snippets cannot affect each other or the interpreter.
+
+The server talks to an interpreter over two pipes, one line per message:
+it sends ``script<TAB>log<TAB>cwd``, the interpreter forks, replies
+``PID<TAB>pid``, waits for the child and replies ``EXIT<TAB>code``. While
+a snippet runs, the server kills its process tree when it exceeds its time
+or memory limit. An interpreter is replaced after ``MAX_TASKS`` snippets or
+once its own memory grows past the recycle limit.
+"""
+
+import os
+import select
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+# Snippets served by one interpreter before it is replaced.
+MAX_TASKS = 500
+# Seconds allowed for loading the preloaded libraries.
+READY_TIMEOUT = 600.0
+# Seconds between time and memory checks of a running snippet.
+POLL_INTERVAL = 0.5
+# Seconds a killed snippet's interpreter may take to report its exit.
+KILL_GRACE = 10.0
+
+PYTHON_SERVER = r"""
+import importlib
+import os
+import sys
+import traceback
+import warnings
+
+# Preloaded libraries may have started threads; children only run the snippet.
+warnings.filterwarnings("ignore", message=".*fork", category=DeprecationWarning)
+requests = os.fdopen(int(sys.argv[1]), "r")
+replies = os.fdopen(int(sys.argv[2]), "w", buffering=1)
+for name in filter(None, os.environ.get("BIOTOOLS_PRELOAD", "").split(",")):
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        print(f"Preloading {name} failed: {e}", file=sys.stderr)
+replies.write("READY\n")
+for line in requests:
+    script, log, cwd = line.rstrip("\n").split("\t")
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            requests.close()
+            replies.close()
+            fd = os.open(log, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(fd, 1)
+            os.dup2(fd, 2)
+            os.chdir(cwd)
+            with open(script, "r", encoding="utf8") as file:
+                source = file.read()
+            exec(compile(source, script, "exec"), {"__name__": "__main__"})
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except BaseException as e:
+            # Skip this frame; the traceback starts in the snippet.
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    replies.write(f"PID\t{pid}\n")
+    _, status = os.waitpid(pid, 0)
+    replies.write(f"EXIT\t{os.waitstatus_to_exitcode(status)}\n")
+"""
+
+R_SERVER = r"""
+args <- commandArgs(trailingOnly = TRUE)
+requests <- file(sprintf("/dev/fd/%s", args[1]), open = "r")
+replies <- file(sprintf("/dev/fd/%s", args[2]), open = "w")
+reply <- function(...) {
+  writeLines(paste(..., sep = "\t"), replies)
+  flush(replies)
+}
+for (pkg in strsplit(Sys.getenv("BIOTOOLS_PRELOAD"), ",")[[1]]) {
+  loaded <- suppressWarnings(suppressPackageStartupMessages(
+    require(pkg, character.only = TRUE, quietly = TRUE)
+  ))
+  if (!loaded) message("Preloading ", pkg, " failed")
+}
+reply("READY")
+repeat {
+  line <- readLines(requests, n = 1)
+  if (length(line) == 0) break
+  fields <- strsplit(line, "\t", fixed = TRUE)[[1]]
+  job <- parallel::mcparallel({
+    log <- file(fields[2], open = "wt")
+    sink(log)
+    sink(log, type = "message")
+    status <- tryCatch({
+      setwd(fields[3])
+      source(fields[1], local = new.env(parent = globalenv()), print.eval = TRUE)
+      0L
+    }, error = function(e) {
+      message("Error: ", conditionMessage(e))
+      1L
+    })
+    sink(type = "message")
+    sink()
+    close(log)
+    status
+  })
+  reply("PID", job$pid)
+  result <- parallel::mccollect(job, wait = TRUE)
+  status <- if (length(result) == 1 && is.integer(result[[1]])) result[[1]] else 1L
+  reply("EXIT", status)
+}
+"""
+
+LANGUAGES = {"R": (R_SERVER, ".R"), "python": (PYTHON_SERVER, ".py")}
+
+
+def process_tree(pid: int) -> list:
+    """``pid`` and all its live descendants."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="utf8") as file:
+                # The command name may contain spaces; fields after it don't.
+                ppid = int(file.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def resident_bytes(pids: list) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm", "r", encoding="utf8") as file:
+                total += int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, IndexError, ValueError):
+            pass
+    return total
+
+
+def kill_tree(pid: int):
+    # Parent first, so it cannot react to its children dying.
+    for member in process_tree(pid):
+        try:
+            os.kill(member, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class Interpreter:
+    """One warm interpreter process and its request/reply pipes.
+
+    Args:
+        command: Interpreter command line, followed by the server script.
+        preload: Libraries loaded before the interpreter reports ready.
+        log_path: File receiving the interpreter's own output.
+    """
+
+    def __init__(self, command: list, preload: list, log_path: str):
+        self.command = command
+        self.preload = preload
+        self.log_path = log_path
+        self.tasks = 0
+        self.broken = False
+        self.proc = None
+        self._buffer = b""
+
+    def start(self, timeout: float = READY_TIMEOUT):
+        requests_read, self._requests = os.pipe()
+        self._replies, replies_write = os.pipe()
+        try:
+            try:
+                with open(self.log_path, "ab") as log:
+                    self.proc = subprocess.Popen(
+                        [*self.command, str(requests_read), str(replies_write)],
+                        pass_fds=(requests_read, replies_write),
+                        stdin=subprocess.DEVNULL,
+                        stdout=log,
+                        stderr=subprocess.STDOUT,
+                        env={**os.environ, "BIOTOOLS_PRELOAD": ",".join(self.preload)},
+                        start_new_session=True,
+                    )
+            finally:
+                os.close(requests_read)
+                os.close(replies_write)
+            if self._reply(timeout) != ["READY"]:
+                raise RuntimeError(f"no ready reply within {timeout:.0f}s")
+        except Exception as e:
+            self.close()
+            raise RuntimeError(
+                f"Interpreter {self.command[0]} failed to start ({e}), see {self.log_path}"
+            ) from None
+
+    def _reply(self, timeout: float) -> list | None:
+        """The next reply line split into fields, or None after ``timeout``."""
+        deadline = time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if (
+                remaining <= 0
+                or not select.select([self._replies], [], [], remaining)[0]
+            ):
+                return None
+            chunk = os.read(self._replies, 4096)
+            if not chunk:
+                raise RuntimeError("interpreter exited")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode("utf-8").split("\t")
+
+    def run(
+        self, script: str, log_path: str, cwd: str, timeout: float | None, memory: int
+    ) -> tuple:
+        """Run a script file in a forked child.
+
+        Returns:
+            The exit code, and why the snippet was killed (None if it was not).
+        """
+        try:
+            os.write(self._requests, f"{script}\t{log_path}\t{cwd}\n".encode("utf-8"))
+            fields = self._reply(KILL_GRACE)
+            if fields is None or fields[0] != "PID":
+                raise RuntimeError(f"unexpected reply {fields}")
+            pid = int(fields[1])
+            deadline = None if timeout is None else time.monotonic() + timeout
+            reason = None
+            while True:
+                fields = self._reply(POLL_INTERVAL)
+                if fields is not None:
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    reason = f"timed out after {timeout:g}s"
+                elif memory and resident_bytes(process_tree(pid)) > memory:
+                    reason = f"exceeded {memory / 1024**3:g} GB of memory"
+                if reason is not None:
+                    kill_tree(pid)
+                    fields = self._reply(KILL_GRACE)
+                    if fields is None:
+                        raise RuntimeError("no exit reply after kill")
+                    break
+            self.tasks += 1
+            return int(fields[1]), reason
+        except Exception:
+            self.broken = True
+            raise
+
+    def rss(self) -> int:
+        return resident_bytes([self.proc.pid])
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.proc.wait()
+        for fd in (self._requests, self._replies):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class InterpreterPool:
+    """Warm interpreters of one language that run snippets one at a time each.
+
+    Args:
+        language: "R" or "python".
+        command: Interpreter executable and options (e.g. ["Rscript"]).
+        preload: Libraries every interpreter loads on start.
+        size: Number of interpreters, i.e. snippets running at once.
+        work_dir: Directory for scripts, snippet logs and interpreter logs.
+        recycle_bytes: Resident memory of an idle interpreter above which it
+            is replaced.
+        max_tasks: Snippets after which an interpreter is replaced.
+    """
+
+    def __init__(
+        self,
+        language: str,
+        command: list,
+        preload: list,
+        size: int,
+        work_dir: str,
+        recycle_bytes: int,
+        max_tasks: int = MAX_TASKS,
+    ):
+        self.language = language
+        self.server_script, self.suffix = LANGUAGES[language]
+        self.command = command
+        self.preload = preload
+        self.size = size
+        self.work_dir = work_dir
+        self.recycle_bytes = recycle_bytes
+        self.max_tasks = max_tasks
+        self._idle = []
+        self._count = 0
+        self._cond = threading.Condition()
+
+    def counts(self) -> dict:
+        with self._cond:
+            return {"idle": len(self._idle), "busy": self._count - len(self._idle)}
+
+    def _spawn(self) -> Interpreter:
+        os.makedirs(self.work_dir, exist_ok=True)
+        script = f"{self.work_dir}/server{self.suffix}"
+        tmp_path = f"{script}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as file:
+            file.write(self.server_script)
+        os.replace(tmp_path, script)
+        interpreter = Interpreter(
+            [*self.command, script],
+            self.preload,
+            f"{self.work_dir}/{self.language}.log",
+        )
+        interpreter.start()
+        return interpreter
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                if self._count >= self.size:
+                    return
+                self._count += 1
+            try:
+                interpreter = self._spawn()
+            except Exception as e:
+                with self._cond:
+                    self._count -= 1
+                    self._cond.notify()
+                print(f"{self.language} interpreter pool: {e}")
+                return
+            with self._cond:
+                self._idle.append(interpreter)
+                self._cond.notify()
+
+    def start(self):
+        """Warm the interpreters in a background daemon thread."""
+        threading.Thread(
+            target=self._fill, name=f"{self.language}-interpreters", daemon=True
+        ).start()
+
+    def _acquire(self) -> Interpreter:
+        with self._cond:
+            while not self._idle and self._count >= self.size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._count += 1
+        # Nothing warm yet (cold start or failed warm-up): start one here so
+        # the error, if any, reaches the caller.
+        try:
+            return self._spawn()
+        except Exception:
+            with self._cond:
+                self._count -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, interpreter: Interpreter):
+        if not (
+            interpreter.broken
+            or interpreter.proc.poll() is not None
+            or interpreter.tasks >= self.max_tasks
+            or interpreter.rss() > self.recycle_bytes
+        ):
+            with self._cond:
+                self._idle.append(interpreter)
+                self._cond.notify()
+            return
+        interpreter.close()
+        with self._cond:
+            self._count -= 1
+        # The replacement loads its libraries without holding up the caller.
+        self.start()
+
+    def run(self, code: str, cwd: str, timeout: float | None, memory: int) -> tuple:
+        """Run a snippet; blocks until an interpreter is free and it finishes.
+
+        Args:
+            code: Source of the snippet.
+            cwd: Working directory of the snippet.
+            timeout: Seconds before the snippet is killed (None: no limit).
+            memory: Resident bytes of the snippet's processes before it is
+                killed (0: no limit).
+
+        Returns:
+            The exit code, why the snippet was killed (or None), and the path
+            of its output log.
+        """
+        if self.size <= 0:
+            raise RuntimeError(f"No {self.language} interpreters configured")
+        os.makedirs(f"{self.work_dir}/snippets", exist_ok=True)
+        stem = f"{self.work_dir}/snippets/{self.language}_{uuid.uuid4().hex}"
+        script, log_path = f"{stem}{self.suffix}", f"{stem}.log"
+        with open(script, "w", encoding="utf8") as file:
+            file.write(code)
+        try:
+            interpreter = self._acquire()
+            try:
+                exit_code, reason = interpreter.run(
+                    script, log_path, cwd, timeout, memory
+                )
+            finally:
+                self._release(interpreter)
+        finally:
+            os.remove(script)
+        return exit_code, reason, log_path
@@ -0,0 +1,283 @@
+"""In-process interval index over the annotation BED files.
+
+Each BED is converted once into an Arrow IPC file sorted by chromosome and
+start, with per-chromosome sorted ends and a running maximum of ends stored
+alongside, in compact form (dictionary-encoded strings, int32 coordinates). The file is memory-mapped, and overlap, count and nearest queries
+are answered with binary searches over those arrays, vectorized across all
+query regions of a chromosome.
+"""
+
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+from .catalog import Catalog, read_checked
+from .compact import compact_table, expand_table
+from .metrics import record_scan
+from .store import publish_dir
+
+BED_COLUMNS = ["chrom", "start", "end"]
+# Bumped when the index file layout changes, so older builds are redone.
+INDEX_LAYOUT = 2
+
+
+def bed_column_names(n: int) -> list:
+    """chrom, start, end, then col4, col5, ... for the extra BED columns."""
+    return BED_COLUMNS[:n] + [f"col{number}" for number in range(4, n + 1)]
+
+
+def read_bed_table(path: str) -> pa.Table:
+    """Read a BED file into Arrow; the first three columns are typed."""
+    table = pa_csv.read_csv(
+        path,
+        read_options=pa_csv.ReadOptions(autogenerate_column_names=True),
+        parse_options=pa_csv.ParseOptions(delimiter="\t", quote_char=False),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={"f0": pa.string(), "f1": pa.int64(), "f2": pa.int64()}
+        ),
+    )
+    return table.rename_columns(bed_column_names(table.num_columns))
+
+
+def read_regions(regions) -> pd.DataFrame:
+    """Query regions from a BED file path or a list of "chr:start-end" strings."""
+    if isinstance(regions, str):
+        table = read_bed_table(regions)
+        record_scan(table.num_rows, os.path.getsize(regions))
+        return table.to_pandas()
+    rows = []
+    for region in regions:
+        match = re.fullmatch(r"\s*([^:\s]+)[:\s]+([\d,]+)[-\s]+([\d,]+)\s*", region)
+        if not match:
+            raise ValueError(f"Invalid region {region} (expected chr:start-end)")
+        chrom, start, end = match.groups()
+        rows.append((chrom, int(start.replace(",", "")), int(end.replace(",", ""))))
+    return pd.DataFrame(rows, columns=BED_COLUMNS)
+
+
+class IntervalIndex:
+    """Memory-mapped, chromosome-partitioned interval index of one BED file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._source = pa.memory_map(path)
+        self.table = pa.ipc.open_file(self._source).read_all()
+        metadata = json.loads(self.table.schema.metadata[b"biotools"])
+        self.columns = metadata["columns"]
+        self.segments = {
+            chrom: tuple(bounds) for chrom, bounds in metadata["segments"].items()
+        }
+        self.start = self._array("start")
+        self.end = self._array("end")
+        self.end_sorted = self._array("_end_sorted")
+        self.end_order = self._array("_end_order")
+        self.max_end = self._array("_max_end")
+
+    def _array(self, name: str) -> np.ndarray:
+        column = self.table.column(name)
+        if column.num_chunks == 1:
+            return column.chunk(0).to_numpy()
+        return column.to_numpy()
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def _coordinates(self, values) -> np.ndarray:
+        """Query coordinates in the index dtype, so binary searches do not
+        upcast the mapped arrays."""
+        bounds = np.iinfo(self.start.dtype)
+        return np.clip(values, bounds.min, bounds.max).astype(self.start.dtype)
+
+    @staticmethod
+    def _by_chrom(chroms: np.ndarray):
+        for chrom in pd.unique(chroms):
+            yield chrom, np.flatnonzero(chroms == chrom)
+
+    def count(self, chroms, starts, ends) -> np.ndarray:
+        """Number of intervals overlapping each query region."""
+        chroms = np.asarray(chroms)
+        starts, ends = self._coordinates(starts), self._coordinates(ends)
+        counts = np.zeros(len(chroms), dtype=np.int64)
+        for chrom, queries in self._by_chrom(chroms):
+            if chrom not in self.segments:
+                continue
+            a, b = self.segments[chrom]
+            # Intervals starting before the query end, minus those ending
+            # at or before its start.
+            counts[queries] = np.searchsorted(
+                self.start[a:b], ends[queries], "left"
+            ) - np.searchsorted(self.end_sorted[a:b], starts[queries], "right")
+        return counts
+
+    def overlap(self, chroms, starts, ends) -> tuple:
+        """All (query position, interval row) pairs that overlap."""
+        chroms = np.asarray(chroms)
+        starts, ends = self._coordinates(starts), self._coordinates(ends)
+        query_rows, interval_rows = [], []
+        for chrom, queries in self._by_chrom(chroms):
+            if chrom not in self.segments:
+                continue
+            a, b = self.segments[chrom]
+            q_starts, q_ends = starts[queries], ends[queries]
+            # Candidates start before the query end and come after the last
+            # interval whose running maximum end is still <= query start.
+            lo = np.searchsorted(self.max_end[a:b], q_starts, "right")
+            hi = np.searchsorted(self.start[a:b], q_ends, "left")
+            lengths = np.maximum(hi - lo, 0)
+            total = int(lengths.sum())
+            if total == 0:
+                continue
+            repeat = np.repeat(np.arange(len(queries)), lengths)
+            offsets = np.arange(total) - np.repeat(
+                np.cumsum(lengths) - lengths, lengths
+            )
+            candidates = a + np.repeat(lo, lengths) + offsets
+            keep = self.end[candidates] > q_starts[repeat]
+            query_rows.append(queries[repeat[keep]])
+            interval_rows.append(candidates[keep])
+        if not query_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        query_rows, interval_rows = np.concatenate(query_rows), np.concatenate(
+            interval_rows
+        )
+        order = np.lexsort((interval_rows, query_rows))
+        return query_rows[order], interval_rows[order]
+
+    def nearest(self, chroms, starts, ends) -> tuple:
+        """The closest interval of each query region and its distance.
+
+        Overlapping intervals have distance 0; otherwise the distance follows
+        ``bedtools closest -d`` (book-ended intervals are 1 apart). Regions on
+        a chromosome without intervals get row -1 and distance -1.
+        """
+        chroms = np.asarray(chroms)
+        starts, ends = self._coordinates(starts), self._coordinates(ends)
+        rows = np.full(len(chroms), -1, dtype=np.int64)
+        distances = np.full(len(chroms), -1, dtype=np.int64)
+        for chrom, queries in self._by_chrom(chroms):
+            if chrom not in self.segments:
+                continue
+            a, b = self.segments[chrom]
+            q_starts, q_ends = starts[queries], ends[queries]
+            best = np.full(len(queries), np.iinfo(np.int64).max)
+            best_rows = np.full(len(queries), -1, dtype=np.int64)
+            up = np.searchsorted(self.end_sorted[a:b], q_starts, "right") - 1
+            has_up = up >= 0
+            up_rows = a + self.end_order[a:b][np.maximum(up, 0)]
+            up_ends = self.end_sorted[a:b][np.maximum(up, 0)].astype(np.int64)
+            up_distance = q_starts - up_ends + 1
+            better = has_up & (up_distance < best)
+            best[better], best_rows[better] = up_distance[better], up_rows[better]
+            down = np.searchsorted(self.start[a:b], q_ends, "left")
+            has_down = down < b - a
+            down_rows = a + np.minimum(down, b - a - 1)
+            down_distance = self.start[down_rows].astype(np.int64) - q_ends + 1
+            better = has_down & (down_distance < best)
+            best[better], best_rows[better] = down_distance[better], down_rows[better]
+            distances[queries], rows[queries] = best, best_rows
+        overlap_queries, overlap_rows = self.overlap(chroms, starts, ends)
+        first = np.unique(overlap_queries, return_index=True)[1]
+        rows[overlap_queries[first]] = overlap_rows[first]
+        distances[overlap_queries[first]] = 0
+        return rows, distances
+
+    def rows(self, rows: np.ndarray) -> pd.DataFrame:
+        """The original BED columns of the given interval rows."""
+        table = self.table.select(self.columns).take(pa.array(rows))
+        record_scan(table.num_rows, table.nbytes)
+        return expand_table(table).to_pandas()
+
+
+def build_index(bed_path: str, index_dir: str, checksum: str | None = None) -> str:
+    """Build the interval index of a BED file into ``index_dir`` if missing.
+
+    Safe to call from several processes at once; the first finished build is
+    published and the others are discarded. With a ``checksum``, a file that
+    no longer has it is not indexed.
+    """
+    if os.path.exists(f"{index_dir}/index.arrow"):
+        return index_dir
+    if checksum is None:
+        table = read_bed_table(bed_path)
+    else:
+        table = read_checked(bed_path, checksum, read_bed_table)
+    table = table.sort_by([("chrom", "ascending"), ("start", "ascending")])
+    columns = table.column_names
+    codes = pc.dictionary_encode(table.column("chrom")).combine_chunks()
+    codes = codes.indices.to_numpy()
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1, [len(codes)]])
+    chroms = table.column("chrom")
+    ends = table.column("end").to_numpy()
+    end_sorted = np.empty_like(ends)
+    end_order = np.empty_like(ends)
+    max_end = np.empty_like(ends)
+    segments = {}
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        segments[chroms[int(a)].as_py()] = [int(a), int(b)]
+        order = np.argsort(ends[a:b], kind="stable")
+        end_order[a:b] = order
+        end_sorted[a:b] = ends[a:b][order]
+        max_end[a:b] = np.maximum.accumulate(ends[a:b])
+    table = table.append_column("_end_sorted", pa.array(end_sorted))
+    table = table.append_column("_end_order", pa.array(end_order))
+    table = table.append_column("_max_end", pa.array(max_end))
+    table = (
+        compact_table(table)
+        .combine_chunks()
+        .replace_schema_metadata(
+            {"biotools": json.dumps({"columns": columns, "segments": segments})}
+        )
+    )
+    tmp_dir = f"{index_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    with pa.OSFile(f"{tmp_dir}/index.arrow", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+    publish_dir(tmp_dir, index_dir)
+    return index_dir
+
+
+class IntervalStore:
+    """Builds and caches an IntervalIndex per annotation BED in the catalog.
+
+    Args:
+        store_dir: Writable directory for the built indexes.
+        catalog: Catalog providing paths and checksums of the BED files.
+    """
+
+    def __init__(self, store_dir: str, catalog: Catalog):
+        self.store_dir = store_dir
+        self.catalog = catalog
+        self._lock = threading.RLock()
+        self._indexes = {}
+
+    def index_dir(self, key: str) -> str:
+        return f"{self.store_dir}/{key}/{self.catalog.checksum(key)}.v{INDEX_LAYOUT}"
+
+    def build(self, key: str) -> str:
+        """Build the index of one BED file unless it is already there."""
+        with self._lock:
+            return build_index(
+                self.catalog.path(key),
+                self.index_dir(key),
+                self.catalog.checksum(key),
+            )
+
+    def get(self, key: str) -> IntervalIndex:
+        """The interval index of an annotation BED, built on first use."""
+        checksum = self.catalog.checksum(key)
+        if checksum is None:
+            raise KeyError(f"Biological type {key} not found in local database")
+        with self._lock:
+            cached = self._indexes.get(key)
+            if cached is None or cached[0] != checksum:
+                cached = (checksum, IntervalIndex(f"{self.build(key)}/index.arrow"))
+                self._indexes[key] = cached
+            return cached[1]
@@ -0,0 +1,365 @@
+"""Persistent background job scheduler for long-running shell commands.
+
+Jobs are kept in a SQLite queue and started by a daemon thread when they fit
+in the global CPU and memory budget, highest priority first (FIFO within a
+priority). Budgets are reservations declared at submit time, not enforced
+limits. Each job runs in its own session with its output in a log file and
+its exit code written to a sidecar file, so jobs that outlive a server
+restart are adopted again and their result is still collected. A job's
+process is recognised by its pid together with its start time, so a
+recycled pid is never mistaken for the job.
+
+A job may wait for other jobs (``after``): it becomes eligible once they
+are all done, and is cancelled if one of them fails, so a chain of stages
+can be queued at once. Jobs waiting on dependencies do not hold up the
+queue.
+"""
+
+import contextlib
+import os
+import signal
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+
+from .metrics import JOB_QUEUE_SECONDS
+
+FINISHED_STATES = ("done", "failed", "cancelled", "lost")
+
+
+def total_memory_gb() -> float:
+    try:
+        with open("/proc/meminfo", "r", encoding="utf8") as file:
+            for line in file:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) / 1024**2
+    except OSError:
+        pass
+    return 16.0
+
+
+def pid_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="utf8") as file:
+            # Exited children of a dead server that nobody has reaped yet.
+            return file.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+
+def process_identity(pid: int) -> str | None:
+    """Boot id and start time of a process, which unlike its pid are not
+    reused by a later process."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r", encoding="utf8") as file:
+            boot_id = file.read().strip()
+        with open(f"/proc/{pid}/stat", "r", encoding="utf8") as file:
+            # Field 22 (starttime) counts from the field after the comm.
+            starttime = file.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+    return f"{boot_id}:{starttime}"
+
+
+def tail_file(path: str, lines: int, chunk_size: int = 1 << 16) -> str:
+    """The last ``lines`` lines of a file, read backwards from its end."""
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        position, data = file.tell(), b""
+        while position > 0 and data.count(b"\n") <= lines:
+            step = min(chunk_size, position)
+            position -= step
+            file.seek(position)
+            data = file.read(step) + data
+    return b"\n".join(data.splitlines()[-lines:]).decode("utf-8", errors="replace")
+
+
+class JobScheduler:
+    """Queue, budget and lifecycle of background shell jobs.
+
+    Args:
+        db_path: Path of the SQLite job table.
+        log_dir: Directory for job logs and exit code files.
+        cpus: Total CPUs that running jobs may reserve.
+        memory_gb: Total memory (GB) that running jobs may reserve.
+        interval: Seconds between scheduling passes.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        log_dir: str,
+        cpus: int,
+        memory_gb: float,
+        interval: float = 1.0,
+    ):
+        self.db_path = db_path
+        self.log_dir = log_dir
+        self.cpus = cpus
+        self.memory_gb = memory_gb
+        self.interval = interval
+        self._procs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        os.makedirs(log_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, command TEXT, cwd TEXT, cpus INTEGER, "
+                "memory_gb REAL, priority INTEGER, state TEXT, submitted REAL, "
+                "started REAL, finished REAL, pid INTEGER, returncode INTEGER, "
+                "after TEXT, process TEXT)"
+            )
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "after" not in columns:
+                # Queues created before job dependencies.
+                conn.execute("ALTER TABLE jobs ADD COLUMN after TEXT")
+            if "process" not in columns:
+                # Queues created before jobs recorded their process identity.
+                conn.execute("ALTER TABLE jobs ADD COLUMN process TEXT")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def log_path(self, job_id: str) -> str:
+        return f"{self.log_dir}/{job_id}.log"
+
+    def _exit_path(self, job_id: str) -> str:
+        return f"{self.log_dir}/{job_id}.exit"
+
+    def submit(
+        self,
+        command: str,
+        cpus: int = 1,
+        memory_gb: float = 1.0,
+        priority: int = 0,
+        cwd: str | None = None,
+        after: list | None = None,
+    ) -> str:
+        """Queue a command; ``after`` lists job ids that must be done first."""
+        if cpus > self.cpus or memory_gb > self.memory_gb:
+            raise ValueError(
+                f"Job exceeds the server budget ({self.cpus} CPUs, "
+                f"{self.memory_gb:.0f} GB memory)"
+            )
+        if cwd and not os.path.isdir(cwd):
+            raise ValueError(f"Working directory {cwd} not found")
+        job_id = uuid.uuid4().hex[:12]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, command, cwd, cpus, memory_gb, priority, "
+                "state, submitted, after) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (
+                    job_id,
+                    command,
+                    cwd,
+                    cpus,
+                    memory_gb,
+                    priority,
+                    time.time(),
+                    " ".join(after) if after else None,
+                ),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def recent(self, limit: int = 20) -> list:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs ORDER BY submitted DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def counts(self) -> dict:
+        """Number of jobs in each state."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def queue_position(self, job_id: str) -> int | None:
+        """1-based position of a queued job in start order."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE state = 'queued' "
+                "ORDER BY priority DESC, submitted"
+            ).fetchall()
+        ids = [row["id"] for row in rows]
+        return ids.index(job_id) + 1 if job_id in ids else None
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if already finished."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row["state"] in FINISHED_STATES:
+                return False
+            if row["state"] == "running" and self._alive(row):
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(row["pid"], signal.SIGTERM)
+            conn.execute(
+                "UPDATE jobs SET state = 'cancelled', finished = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+            return True
+
+    def _start(self, conn, job: sqlite3.Row):
+        with open(self.log_path(job["id"]), "ab") as log:
+            proc = subprocess.Popen(
+                # The outer shell records the exit code even if the server
+                # restarts before the job finishes.
+                ["bash", "-c", 'bash -c "$0"; echo $? > "$1"']
+                + [job["command"], self._exit_path(job["id"])],
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                cwd=job["cwd"] or None,
+                start_new_session=True,
+            )
+        self._procs[job["id"]] = proc
+        JOB_QUEUE_SECONDS.observe(time.time() - job["submitted"])
+        conn.execute(
+            "UPDATE jobs SET state = 'running', started = ?, pid = ?, process = ? "
+            "WHERE id = ?",
+            (time.time(), proc.pid, process_identity(proc.pid), job["id"]),
+        )
+
+    def _alive(self, job: sqlite3.Row) -> bool:
+        """Whether the process started for a running job still exists."""
+        proc = self._procs.get(job["id"])
+        if proc is not None:
+            return proc.poll() is None
+        if not pid_running(job["pid"]):
+            return False
+        # Jobs recorded before process identities can only be matched by pid.
+        return job["process"] is None or process_identity(job["pid"]) == job["process"]
+
+    def _fail(self, conn, job: sqlite3.Row, error: Exception):
+        with open(self.log_path(job["id"]), "a", encoding="utf8") as log:
+            log.write(f"Failed to start: {error}\n")
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', finished = ? WHERE id = ?",
+            (time.time(), job["id"]),
+        )
+
+    def _reap(self, conn, job: sqlite3.Row):
+        proc = self._procs.get(job["id"])
+        if proc is not None:
+            if proc.poll() is None:
+                return
+            del self._procs[job["id"]]
+        elif self._alive(job):
+            # Adopted from a previous server process.
+            return
+        try:
+            with open(self._exit_path(job["id"]), "r", encoding="utf8") as file:
+                returncode = int(file.read().strip())
+            state = "done" if returncode == 0 else "failed"
+        except (OSError, ValueError):
+            returncode, state = None, "lost"
+        conn.execute(
+            "UPDATE jobs SET state = ?, returncode = ?, finished = ? "
+            "WHERE id = ? AND state = 'running'",
+            (state, returncode, time.time(), job["id"]),
+        )
+
+    def _waiting(self, conn, job: sqlite3.Row) -> bool | None:
+        """Whether a job still waits for its dependencies; None if one of
+        them failed, was cancelled or is unknown."""
+        after = job["after"].split()
+        rows = conn.execute(
+            f"SELECT id, state FROM jobs WHERE id IN ({', '.join('?' * len(after))})",
+            after,
+        ).fetchall()
+        states = {row["id"]: row["state"] for row in rows}
+        if any(
+            states.get(job_id) in (None, "failed", "cancelled", "lost")
+            for job_id in after
+        ):
+            return None
+        return any(states[job_id] != "done" for job_id in after)
+
+    def schedule(self):
+        """Collect finished jobs and start queued ones that fit the budget."""
+        with self._lock, self._connect() as conn:
+            running = conn.execute(
+                "SELECT * FROM jobs WHERE state = 'running'"
+            ).fetchall()
+            for job in running:
+                self._reap(conn, job)
+            for job_id in list(self._procs):
+                # Cancelled jobs: drop the handle once the process is gone.
+                if self._procs[job_id].poll() is not None:
+                    row = conn.execute(
+                        "SELECT state FROM jobs WHERE id = ?", (job_id,)
+                    ).fetchone()
+                    if row is None or row["state"] != "running":
+                        del self._procs[job_id]
+            used = conn.execute(
+                "SELECT COALESCE(SUM(cpus), 0), COALESCE(SUM(memory_gb), 0) "
+                "FROM jobs WHERE state = 'running'"
+            ).fetchone()
+            free_cpus, free_memory = self.cpus - used[0], self.memory_gb - used[1]
+            queued = conn.execute(
+                "SELECT * FROM jobs WHERE state = 'queued' "
+                "ORDER BY priority DESC, submitted"
+            ).fetchall()
+            for job in queued:
+                if job["after"]:
+                    waiting = self._waiting(conn, job)
+                    if waiting is None:
+                        conn.execute(
+                            "UPDATE jobs SET state = 'cancelled', finished = ? "
+                            "WHERE id = ?",
+                            (time.time(), job["id"]),
+                        )
+                    if waiting is not False:
+                        continue
+                # Strict order: a job that does not fit blocks lower ones, so
+                # large jobs are not starved by a stream of small ones.
+                if job["cpus"] > free_cpus or job["memory_gb"] > free_memory:
+                    break
+                try:
+                    self._start(conn, job)
+                except Exception as e:
+                    # Only this job fails; the jobs started in this pass and
+                    # the rest of the queue go on.
+                    self._fail(conn, job, e)
+                    continue
+                free_cpus -= job["cpus"]
+                free_memory -= job["memory_gb"]
+
+    def start(self):
+        """Run the scheduler in a background daemon thread."""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                try:
+                    self.schedule()
+                except Exception as e:
+                    print(f"Job scheduling failed: {e}")
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=run, name="job-scheduler", daemon=True)
+        self._thread.start()
@@ -0,0 +1,84 @@
+"""In-process materialization of library files into an output directory.
+
+Files are linked rather than copied where the filesystem allows it: a reflink
+(copy-on-write clone) first, then a hardlink, then a symlink. Outputs are
+assembled under a temporary name and renamed into place, so concurrent
+identical requests never see a half-built directory.
+"""
+
+import os
+import shutil
+
+FICLONE = 0x40049409
+
+
+def reflink(src: str, dst: str):
+    try:
+        import fcntl
+    except ImportError as e:
+        raise OSError("reflink is not supported on this platform") from e
+    # "xb": never truncate an existing destination, which may be a link to
+    # the source itself.
+    with open(src, "rb") as source, open(dst, "xb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            os.remove(dst)
+            raise
+
+
+def link_file(src: str, dst: str) -> str:
+    """Make ``dst`` refer to ``src`` without copying bytes. Returns the method."""
+    try:
+        reflink(src, dst)
+        return "reflink"
+    except OSError:
+        pass
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    os.symlink(src, dst)
+    return "symlink"
+
+
+def materialize_dir(sources: list, out_dir: str, mode: str = "link") -> list:
+    """Populate ``out_dir`` with the source files, atomically.
+
+    Args:
+        sources: Paths of the files to expose.
+        out_dir: Final output directory.
+        mode: "link" to link files without copying, "copy" for byte copies.
+
+    Returns:
+        Paths of the files inside ``out_dir``, in source order.
+    """
+    targets = [f"{out_dir}/{os.path.basename(src)}" for src in sources]
+    if os.path.isdir(out_dir):
+        return targets
+    tmp_dir = f"{out_dir}.{os.getpid()}.{id(targets)}.tmp"
+    os.makedirs(tmp_dir)
+    try:
+        for src in sources:
+            dst = f"{tmp_dir}/{os.path.basename(src)}"
+            if mode == "copy":
+                shutil.copyfile(src, dst)
+            else:
+                link_file(src, dst)
+        os.rename(tmp_dir, out_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # A concurrent identical request published the directory first.
+        if not os.path.isdir(out_dir):
+            raise
+    return targets
+
+
+def materialize_manifest(sources: list, out_path: str) -> str:
+    """Write the source paths, one per line, to ``out_path`` atomically."""
+    tmp_path = f"{out_path}.{os.getpid()}.{id(sources)}.tmp"
+    with open(tmp_path, "w", encoding="utf8") as file:
+        file.write("".join(f"{src}\n" for src in sources))
+    os.replace(tmp_path, out_path)
+    return out_path
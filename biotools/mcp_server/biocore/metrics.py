@@ -0,0 +1,281 @@
+"""Process-wide tool metrics in the Prometheus text exposition format.
+
+A small in-process registry (counters, gauges and histograms with labels) is
+enough for one server process, so no client library is needed. The tool
+being served is tracked in a context variable: the server sets it around
+each tool call, and the data layer attributes rows scanned, bytes read and
+bytes written to it with ``record_scan`` and ``record_write``. Context
+variables follow the call into ``BlockingPool`` threads, but not into
+process pool workers.
+
+Each server worker process has its own registry. With several workers,
+every worker labels its series with its index and serves them on a port of
+its own (``serve``), so a scrape is never answered by a random worker.
+"""
+
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+current_tool = contextvars.ContextVar("biotools_tool", default="")
+current_outcome = contextvars.ContextVar("biotools_outcome", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUEUE_BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 24 * 3600)
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace("\\", "\\\\").replace('"', '\\"')}"'
+        for name, value in labels.items()
+    )
+    return f"{{{pairs}}}"
+
+
+class Metric:
+    """Base of a labelled metric family."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        """Yield (suffix, labels, value) for every series."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", dict(zip(self.labelnames, key)), value
+
+    def render(self, constant_labels: dict | None = None) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, value in self.samples():
+            labels = {**(constant_labels or {}), **labels}
+            lines.append(
+                f"{self.name}{suffix}{format_labels(labels)} {format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A gauge set directly, or read from ``callback`` at scrape time.
+
+    The callback returns a dict mapping label value tuples to values.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self.callback is None:
+            yield from super().samples()
+            return
+        for key, value in self.callback().items():
+            yield "", dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(c), s)) for key, (c, s) in self._values.items()]
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                yield "_bucket", {**labels, "le": format_value(bound)}, count
+            yield "_sum", labels, total
+            yield "_count", labels, counts[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        # Added to every series, e.g. {"worker": "0"}.
+        self.labels = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        return (
+            "\n".join(metric.render(self.labels) for metric in self.metrics.values())
+            + "\n"
+        )
+
+
+REGISTRY = Registry()
+TOOL_CALLS = REGISTRY.counter(
+    "biotools_tool_calls_total", "Tool calls by result.", ["tool", "status"]
+)
+TOOL_DURATION = REGISTRY.histogram(
+    "biotools_tool_duration_seconds", "Tool call latency.", ["tool"]
+)
+TOOL_IN_FLIGHT = REGISTRY.gauge(
+    "biotools_tool_in_flight", "Tool calls currently running.", ["tool"]
+)
+ROWS_SCANNED = REGISTRY.counter(
+    "biotools_rows_scanned_total", "Data rows read by tools.", ["tool"]
+)
+BYTES_READ = REGISTRY.counter(
+    "biotools_bytes_read_total", "Data bytes read by tools.", ["tool"]
+)
+BYTES_WRITTEN = REGISTRY.counter(
+    "biotools_bytes_written_total", "Output bytes written by tools.", ["tool"]
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "biotools_cache_requests_total", "Cache lookups by result.", ["cache", "result"]
+)
+COALESCED_CALLS = REGISTRY.counter(
+    "biotools_coalesced_calls_total",
+    "Calls that waited for an identical running call instead of computing.",
+    ["tool"],
+)
+JOB_QUEUE_SECONDS = REGISTRY.histogram(
+    "biotools_job_queue_seconds",
+    "Time background jobs waited in the queue.",
+    buckets=QUEUE_BUCKETS,
+)
+
+
+def serve(host: str, port: int, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve ``registry`` at ``http://host:port/metrics`` from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+def record_scan(rows: int, nbytes: int):
+    """Attribute rows and bytes read to the current tool call."""
+    tool = current_tool.get()
+    ROWS_SCANNED.inc(rows, tool=tool)
+    BYTES_READ.inc(nbytes, tool=tool)
+
+
+def record_write(nbytes: int):
+    """Attribute output bytes written to the current tool call."""
+    BYTES_WRITTEN.inc(nbytes, tool=current_tool.get())
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_coalesced():
+    COALESCED_CALLS.inc(tool=current_tool.get())
+
+
+@contextlib.contextmanager
+def track_tool(tool: str):
+    """Measure one tool call; yields a dict whose "error" flag marks failures."""
+    token = current_tool.set(tool)
+    TOOL_IN_FLIGHT.inc(tool=tool)
+    start = time.perf_counter()
+    outcome = {"error": False}
+    outcome_token = current_outcome.set(outcome)
+    try:
+        yield outcome
+    except BaseException:
+        outcome["error"] = True
+        raise
+    finally:
+        TOOL_DURATION.observe(time.perf_counter() - start, tool=tool)
+        TOOL_CALLS.inc(tool=tool, status="error" if outcome["error"] else "ok")
+        TOOL_IN_FLIGHT.dec(tool=tool)
+        current_outcome.reset(outcome_token)
+        current_tool.reset(token)
+
+
+def record_error():
+    """Mark the current tool call as failed. Tools answer most failures with
+    a message rather than an exception, so they report them here."""
+    outcome = current_outcome.get()
+    if outcome is not None:
+        outcome["error"] = True
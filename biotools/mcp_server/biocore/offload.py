@@ -0,0 +1,74 @@
+"""Run blocking tool bodies off the asyncio event loop.
+
+The MCP server handles every client on one event loop, so a tool that reads
+or writes large tables synchronously stalls all other requests. Tools
+wrapped with ``BlockingPool.offload`` run on a bounded thread pool instead;
+pandas, numpy and pyarrow release the GIL for most of their work, and the
+loop stays free to answer light tools. Admission is bounded: once all
+workers are busy and ``max_pending`` calls are waiting, new calls are
+rejected immediately rather than queued without limit.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolBusy(RuntimeError):
+    pass
+
+
+class BlockingPool:
+    """Thread pool with bounded admission for blocking tool bodies.
+
+    Args:
+        workers: Number of worker threads.
+        max_pending: Calls allowed to wait for a free worker.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="biotools")
+        # Only touched from the event loop thread.
+        self._admitted = 0
+
+    @property
+    def admitted(self) -> int:
+        """Calls running or waiting in the pool."""
+        return self._admitted
+
+    async def run(self, fn, *args, **kwargs):
+        if self._admitted >= self.workers + self.max_pending:
+            raise PoolBusy(
+                f"Server busy: {self._admitted} data requests in progress, "
+                "please try again later."
+            )
+        self._admitted += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # Carry context variables (the current tool for metrics) along.
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(context.run, fn, *args, **kwargs)
+            )
+        finally:
+            self._admitted -= 1
+
+    def offload(self, fn):
+        """Wrap a blocking tool function as a coroutine run in the pool.
+
+        The wrapper keeps the signature and docstring of ``fn``, so it can be
+        registered as an MCP tool directly. Rejected calls return the busy
+        message, like any other tool error.
+        """
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await self.run(fn, *args, **kwargs)
+            except PoolBusy as e:
+                return str(e)
+
+        return wrapper
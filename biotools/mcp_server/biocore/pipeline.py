@@ -0,0 +1,357 @@
+"""Paired-end ChIP-seq pipeline on the background job scheduler.
+
+The pipeline is a fixed DAG per sample::
+
+    fastqc
+    trim_galore -> bowtie2 -> picard -> samtools -> macs2
+                                                 -> bamCoverage
+
+Every stage of every sample is queued as one job that waits for its
+upstream jobs, so fastqc and trimming run side by side, samples run
+concurrently, and each stage reserves its own CPUs and memory from the
+scheduler budget.
+
+Each stage writes into a checkpoint directory named after a key: the hash of
+its command with the raw FASTQ (and control BAM) paths replaced by their
+content hashes and the upstream directories by the upstream keys, i.e. of
+its parameters and everything it was computed from. The thread count is not
+part of the key. A stage writes to ``<checkpoint>.tmp`` and renames it on
+success, so a checkpoint directory is always complete. Submitting the same
+sample sheet again therefore skips finished stages, attaches to stages that
+are still queued or running, and runs only what failed or changed.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shlex
+
+import pandas as pd
+
+from .catalog import file_checksum
+
+DEFAULT_PARAMS = {
+    "genome_index": "/data/rgtdata/hg38/genome_hg38",
+    "genome_size": "hs",
+    "min_quality": 20,
+    "qvalue": 0.01,
+    "bin_size": 1,
+}
+
+# Upstream stages, default threads and memory (GB) and command of each stage.
+# {out} is the checkpoint directory (also the working directory) and an
+# upstream stage name stands for that stage's checkpoint directory.
+STAGES = {
+    "fastqc": {
+        "after": [],
+        "cpus": 2,
+        "memory_gb": 2,
+        "command": "fastqc --threads {cpus} -o {out} {fastq_1} {fastq_2}",
+    },
+    "trim_galore": {
+        "after": [],
+        "cpus": 4,
+        "memory_gb": 4,
+        "command": (
+            "trim_galore -q {min_quality} --phred33 --stringency 3 --length 20 "
+            "-e 0.1 --paired --gzip --cores {cpus} -o {out} {fastq_1} {fastq_2} && "
+            "mv {out}/*_val_1.fq.gz {out}/read1.fq.gz && "
+            "mv {out}/*_val_2.fq.gz {out}/read2.fq.gz"
+        ),
+    },
+    "bowtie2": {
+        "after": ["trim_galore"],
+        "cpus": 16,
+        "memory_gb": 8,
+        "command": (
+            "bowtie2 --threads {cpus} -k 1 -x {genome_index} "
+            "-1 {trim_galore}/read1.fq.gz -2 {trim_galore}/read2.fq.gz | "
+            "samtools view -F 4 -b - | samtools sort --threads {cpus} -o {out}/raw.bam"
+        ),
+    },
+    "picard": {
+        "after": ["bowtie2"],
+        "cpus": 2,
+        "memory_gb": 8,
+        "command": (
+            "picard MarkDuplicates I={bowtie2}/raw.bam "
+            "O={out}/marked_duplicates.bam M={out}/metrics.txt"
+        ),
+    },
+    "samtools": {
+        "after": ["picard"],
+        "cpus": 4,
+        "memory_gb": 2,
+        "command": (
+            "ln -s {picard}/marked_duplicates.bam {out}/marked_duplicates.bam && "
+            "samtools index -@ {cpus} {out}/marked_duplicates.bam"
+        ),
+    },
+    "macs2": {
+        "after": ["samtools"],
+        "cpus": 1,
+        "memory_gb": 4,
+        "command": (
+            "macs2 callpeak --shift -100 --extsize 200 --SPMR --nomodel -B "
+            "-g {genome_size} -q {qvalue} -f BAM "
+            "-t {samtools}/marked_duplicates.bam{control} --outdir {out} -n {sample}"
+        ),
+    },
+    "bamCoverage": {
+        "after": ["samtools"],
+        "cpus": 8,
+        "memory_gb": 4,
+        "command": (
+            "bamCoverage -b {samtools}/marked_duplicates.bam --ignoreDuplicates "
+            "--skipNonCoveredRegions --normalizeUsing RPKM --binSize {bin_size} "
+            "-p {cpus} -o {out}/final.bw"
+        ),
+    },
+}
+
+
+def read_sample_sheet(path: str) -> list:
+    """Samples of a CSV or TSV sheet with columns sample, fastq_1, fastq_2
+    and optionally control (a sample of the sheet or a BAM file).
+
+    Relative file paths are resolved against the sheet's directory.
+    """
+    sheet = pd.read_csv(path, sep=None, engine="python", dtype=str).fillna("")
+    missing = {"sample", "fastq_1", "fastq_2"} - set(sheet.columns)
+    if missing:
+        raise ValueError(
+            f"Sample sheet is missing columns: {', '.join(sorted(missing))}"
+        )
+    if sheet["sample"].duplicated().any() or (sheet["sample"] == "").any():
+        raise ValueError("Sample names must be unique and non-empty")
+    base = os.path.dirname(os.path.abspath(path))
+    names = set(sheet["sample"])
+    samples = []
+    for row in sheet.to_dict(orient="records"):
+        sample = {"sample": row["sample"], "control": row.get("control", "")}
+        for column in ("fastq_1", "fastq_2"):
+            sample[column] = os.path.join(base, row[column])
+            if not os.path.isfile(sample[column]):
+                raise ValueError(f"{row['sample']}: {row[column]} not found")
+        if sample["control"] and sample["control"] not in names:
+            sample["control"] = os.path.join(base, sample["control"])
+            if not os.path.isfile(sample["control"]):
+                raise ValueError(f"{row['sample']}: control {row['control']} not found")
+        samples.append(sample)
+    return samples
+
+
+class ChipSeqPipeline:
+    """Plans sample sheets into checkpointed stage jobs.
+
+    Args:
+        scheduler: The job scheduler running the stages.
+        checkpoint_dir: Directory of the stage checkpoints, shared by all
+            pipeline runs.
+    """
+
+    def __init__(self, scheduler, checkpoint_dir: str):
+        self.scheduler = scheduler
+        self.checkpoint_dir = checkpoint_dir
+
+    def _content_hash(self, path: str, hashes: dict) -> str:
+        """md5 of a file, cached by path, size and mtime in ``hashes``."""
+        stat = os.stat(path)
+        identity = f"{os.path.realpath(path)}\t{stat.st_size}\t{stat.st_mtime_ns}"
+        if identity not in hashes:
+            hashes[identity] = file_checksum(path)
+        return hashes[identity]
+
+    def plan(self, samples: list, params: dict, threads: dict, hashes: dict) -> list:
+        """Stages of all samples in dependency order, with their keys,
+        checkpoint directories, commands and reservations."""
+        names = {sample["sample"] for sample in samples}
+        controls = {sample["control"] for sample in samples} & names
+        entries = {}
+        # Control samples first: peak calling of the others waits for them.
+        for sample in sorted(
+            samples, key=lambda sample: sample["sample"] not in controls
+        ):
+            name = sample["sample"]
+            # Output file names of fastqc and the trimming reports follow the
+            # input file names, so those are part of the key too.
+            inputs = {
+                column: (
+                    shlex.quote(sample[column]),
+                    f"{os.path.basename(sample[column])}@"
+                    f"{self._content_hash(sample[column], hashes)}",
+                )
+                for column in ("fastq_1", "fastq_2")
+            }
+            control, after = ("", ""), []
+            if sample["control"] in controls and name not in controls:
+                upstream = entries[sample["control"], "samtools"]
+                path = f"{upstream['checkpoint']}/marked_duplicates.bam"
+                control = (f" -c {shlex.quote(path)}", f" -c {upstream['key']}")
+                after = [upstream]
+            elif sample["control"]:
+                control = (
+                    f" -c {shlex.quote(sample['control'])}",
+                    f" -c {self._content_hash(sample['control'], hashes)}",
+                )
+            for stage, spec in STAGES.items():
+                # Samples used as controls get no peaks of their own.
+                if stage == "macs2" and name in controls:
+                    continue
+                upstream = [entries[name, other] for other in spec["after"]]
+                values = {
+                    **{key: shlex.quote(str(value)) for key, value in params.items()},
+                    "sample": shlex.quote(name),
+                    "out": "{out}",
+                    "cpus": "{cpus}",
+                }
+                key_values = {
+                    **values,
+                    **{column: value[1] for column, value in inputs.items()},
+                    **{other: entries[name, other]["key"] for other in spec["after"]},
+                    "control": control[1],
+                }
+                key = hashlib.md5(
+                    f"{stage}\n{spec['command'].format(**key_values)}".encode("utf-8")
+                ).hexdigest()
+                checkpoint = f"{self.checkpoint_dir}/{stage}-{key}"
+                cpus = min(threads.get(stage, spec["cpus"]), self.scheduler.cpus)
+                command = spec["command"].format(
+                    **values,
+                    **{column: value[0] for column, value in inputs.items()},
+                    **{
+                        other: shlex.quote(entries[name, other]["checkpoint"])
+                        for other in spec["after"]
+                    },
+                    control=control[0] if stage == "macs2" else "",
+                )
+                tmp_dir = shlex.quote(f"{checkpoint}.tmp")
+                command = command.replace("{out}", tmp_dir).replace("{cpus}", str(cpus))
+                entries[name, stage] = {
+                    "sample": name,
+                    "stage": stage,
+                    "key": key,
+                    "checkpoint": checkpoint,
+                    "after": upstream + (after if stage == "macs2" else []),
+                    "cpus": cpus,
+                    "memory_gb": min(spec["memory_gb"], self.scheduler.memory_gb),
+                    "command": (
+                        f"set -eo pipefail\nrm -rf {tmp_dir} && mkdir -p {tmp_dir} "
+                        f"&& cd {tmp_dir}\n"
+                        f"{command}\n"
+                        f"cd / && mv {tmp_dir} {shlex.quote(checkpoint)}"
+                    ),
+                }
+        return list(entries.values())
+
+    def _pending_job(self, checkpoint: str) -> str | None:
+        """The queued or running job already producing a checkpoint."""
+        try:
+            with open(f"{checkpoint}.job", "r", encoding="utf8") as file:
+                job = self.scheduler.get(file.read().strip())
+        except OSError:
+            return None
+        if job is not None and job["state"] in ("queued", "running"):
+            return job["id"]
+        return None
+
+    def submit(
+        self,
+        sample_sheet: str,
+        output_dir: str,
+        params: dict | None = None,
+        threads: dict | None = None,
+        priority: int = 0,
+    ) -> list:
+        """Queue the stages of a sample sheet that have no checkpoint yet.
+
+        Args:
+            sample_sheet: CSV/TSV with sample, fastq_1, fastq_2 (and control).
+            output_dir: Receives ``<sample>/<stage>`` links to the checkpoints
+                and the run manifest ``pipeline.json``.
+            params: Overrides of ``DEFAULT_PARAMS``.
+            threads: Threads per stage name, overriding the stage defaults.
+            priority: Job priority of all stages.
+
+        Returns:
+            The stages with their checkpoint and job id (None when cached).
+        """
+        unknown = set(params or {}) - set(DEFAULT_PARAMS)
+        unknown |= {f"threads.{stage}" for stage in set(threads or {}) - set(STAGES)}
+        if unknown:
+            raise ValueError(f"Unknown pipeline options: {', '.join(sorted(unknown))}")
+        params = {**DEFAULT_PARAMS, **(params or {})}
+        samples = read_sample_sheet(sample_sheet)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        hashes_path = f"{self.checkpoint_dir}/hashes.json"
+        # One planner at a time, across server workers, so a stage is never
+        # queued twice.
+        with open(f"{self.checkpoint_dir}/plan.lock", "a+") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(hashes_path, "r", encoding="utf8") as file:
+                    hashes = json.load(file)
+            except (OSError, ValueError):
+                hashes = {}
+            entries = self.plan(samples, params, threads or {}, hashes)
+            tmp_path = f"{hashes_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf8") as file:
+                json.dump(hashes, file)
+            os.replace(tmp_path, hashes_path)
+            for entry in entries:
+                entry["job"] = None
+                if os.path.isdir(entry["checkpoint"]):
+                    continue
+                entry["job"] = self._pending_job(entry["checkpoint"])
+                if entry["job"] is None:
+                    entry["job"] = self.scheduler.submit(
+                        entry["command"],
+                        entry["cpus"],
+                        entry["memory_gb"],
+                        priority,
+                        after=[
+                            upstream["job"]
+                            for upstream in entry["after"]
+                            if upstream["job"] is not None
+                        ],
+                    )
+                    with open(
+                        f"{entry['checkpoint']}.job", "w", encoding="utf8"
+                    ) as file:
+                        file.write(entry["job"])
+        for entry in entries:
+            link = f"{output_dir}/{entry['sample']}/{entry['stage']}"
+            os.makedirs(os.path.dirname(link), exist_ok=True)
+            tmp_link = f"{link}.{os.getpid()}.tmp"
+            os.symlink(entry["checkpoint"], tmp_link)
+            os.replace(tmp_link, link)
+        manifest = {
+            "sample_sheet": os.path.abspath(sample_sheet),
+            "params": params,
+            "stages": [
+                {
+                    key: entry[key]
+                    for key in ("sample", "stage", "key", "checkpoint", "job")
+                }
+                for entry in entries
+            ],
+        }
+        tmp_path = f"{output_dir}/pipeline.json.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(tmp_path, f"{output_dir}/pipeline.json")
+        return manifest["stages"]
+
+    def status(self, output_dir: str) -> list:
+        """Stages of the run in ``output_dir`` with their current state:
+        cached, done, or the state of their job."""
+        with open(f"{output_dir}/pipeline.json", "r", encoding="utf8") as file:
+            stages = json.load(file)["stages"]
+        for stage in stages:
+            if os.path.isdir(stage["checkpoint"]):
+                stage["state"] = "cached" if stage["job"] is None else "done"
+            else:
+                job = self.scheduler.get(stage["job"]) if stage["job"] else None
+                stage["state"] = job["state"] if job else "missing"
+        return stages
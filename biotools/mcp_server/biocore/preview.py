@@ -0,0 +1,416 @@
+"""Paged previews of tabular result files.
+
+Text tables (BED, CSV, TSV) are memory-mapped and indexed once: the byte
+offset of every ``STRIDE``-th line and the line count go into a sidecar
+index directory keyed by the file's path, size and mtime, which the caller
+may evict like any other cached output. A page then seeks to the
+nearest indexed line and parses at most ``STRIDE`` lines before it plus the
+page itself, independent of the file size. Parquet pages read only the row
+groups they overlap, and Arrow IPC (Feather) pages slice memory-mapped
+record batches. Gzip-compressed text cannot be seeked; its pages are read
+sequentially from the start and its line count is cached.
+
+Column statistics (nulls, min, max, mean) come from Parquet metadata where
+available and are otherwise computed in one streaming pass and cached in
+the sidecar.
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pyarrow import csv as pa_csv
+
+from .intervals import bed_column_names
+from .metrics import record_scan
+
+STRIDE = 1024
+SCAN_BYTES = 64 << 20
+MAX_ROWS = 200
+MAX_BYTES = 64 << 10
+
+
+def file_format(path: str) -> str:
+    """ "parquet", "feather" or the text delimiter kind of a file."""
+    name = path.lower().removesuffix(".gz")
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith((".feather", ".arrow", ".ipc")):
+        return "feather"
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".bed", ".narrowpeak", ".broadpeak", ".bedgraph")):
+        return "bed"
+    return "tsv"
+
+
+def line_offsets(source, size: int, stride: int = STRIDE) -> tuple:
+    """Byte offsets of every ``stride``-th line start, and the line count.
+
+    The mapped file is scanned for newlines in ``SCAN_BYTES`` blocks, so the
+    temporary arrays stay small.
+    """
+    checkpoints, lines = [0], 0
+    for start in range(0, size, SCAN_BYTES):
+        block = np.frombuffer(
+            source, dtype=np.uint8, count=min(SCAN_BYTES, size - start), offset=start
+        )
+        ends = np.flatnonzero(block == 10) + start + 1
+        # Line numbers (0-based) starting right after each newline.
+        numbers = np.arange(lines + 1, lines + 1 + len(ends))
+        checkpoints.extend(ends[numbers % stride == 0].tolist())
+        lines += len(ends)
+    if size and source[size - 1 : size] != b"\n":
+        lines += 1
+    elif checkpoints[-1] == size and len(checkpoints) > 1:
+        # A checkpoint at EOF is not a line start.
+        checkpoints.pop()
+    return np.asarray(checkpoints, dtype=np.int64), lines
+
+
+class ColumnStats:
+    """Running null count, min, max and mean of the columns of Arrow batches."""
+
+    def __init__(self):
+        self.columns = {}
+
+    def update(self, batch):
+        for name, column in zip(batch.schema.names, batch.columns):
+            entry = self.columns.setdefault(
+                name, {"type": str(column.type), "count": 0, "nulls": 0}
+            )
+            entry["count"] += len(column)
+            entry["nulls"] += column.null_count
+            if len(column) == column.null_count:
+                continue
+            if pa.types.is_dictionary(column.type):
+                column = column.dictionary_decode()
+            if not (
+                pa.types.is_integer(column.type)
+                or pa.types.is_floating(column.type)
+                or pa.types.is_string(column.type)
+                or pa.types.is_large_string(column.type)
+            ):
+                continue
+            bounds = pc.min_max(column).as_py()
+            for stat, pick in (("min", min), ("max", max)):
+                if bounds[stat] is not None:
+                    current = entry.get(stat)
+                    entry[stat] = (
+                        bounds[stat] if current is None else pick(current, bounds[stat])
+                    )
+            if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+                entry["sum"] = entry.get("sum", 0.0) + pc.sum(column).as_py()
+
+    def frame(self) -> pd.DataFrame:
+        rows = {}
+        for name, entry in self.columns.items():
+            values = entry["count"] - entry["nulls"]
+            rows[name] = {
+                "type": entry["type"],
+                "nulls": entry["nulls"],
+                "min": entry.get("min"),
+                "max": entry.get("max"),
+                "mean": entry["sum"] / values if "sum" in entry and values else None,
+            }
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+
+class FilePreview:
+    """Schema, row count, row pages, byte ranges and column statistics of a
+    tabular file.
+
+    Args:
+        path: The file to preview.
+        index_dir: Writable directory for the sidecar indexes. The index of
+            this file goes to ``sidecar``, a directory created on the first
+            write; ``updated`` tells whether this instance wrote to it.
+    """
+
+    def __init__(self, path: str, index_dir: str):
+        self.path = path
+        self.format = file_format(path)
+        self.compressed = path.lower().endswith(".gz")
+        stat = os.stat(path)
+        self.size = stat.st_size
+        identity = f"{os.path.realpath(path)}\t{stat.st_size}\t{stat.st_mtime_ns}"
+        key = hashlib.md5(identity.encode("utf-8")).hexdigest()
+        self.sidecar = f"{index_dir}/{key}"
+        self.updated = False
+        self._info = self._load_info()
+        self._offsets = None
+        self._columns = None
+
+    # Sidecar index
+
+    def _load_info(self) -> dict:
+        try:
+            with open(f"{self.sidecar}/info.json", "r", encoding="utf8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_info(self, **values):
+        self._info.update(values)
+        os.makedirs(self.sidecar, exist_ok=True)
+        tmp_path = f"{self.sidecar}/info.{os.getpid()}.json.tmp"
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(self._info, file, default=str)
+        os.replace(tmp_path, f"{self.sidecar}/info.json")
+        self.updated = True
+
+    def _text_index(self) -> tuple:
+        """(line start checkpoints, line count) of an uncompressed text file."""
+        if self._offsets is None:
+            offsets_path = f"{self.sidecar}/offsets.npy"
+            if "lines" in self._info and os.path.exists(offsets_path):
+                self._offsets = np.load(offsets_path, mmap_mode="r")
+            else:
+                with open(self.path, "rb") as file, mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                ) as source:
+                    self._offsets, lines = line_offsets(source, self.size)
+                    record_scan(lines, self.size)
+                os.makedirs(self.sidecar, exist_ok=True)
+                tmp_path = f"{self.sidecar}/offsets.{os.getpid()}.tmp.npy"
+                np.save(tmp_path, self._offsets)
+                os.replace(tmp_path, offsets_path)
+                self._save_info(lines=lines)
+        return self._offsets, self._info["lines"]
+
+    # Text files
+
+    def _lines(self, start: int, count: int) -> list:
+        """Raw text lines ``start`` to ``start + count`` of the file."""
+        if count <= 0:
+            return []
+        if self.compressed:
+            lines = []
+            with gzip.open(self.path, "rt", newline="") as file:
+                for number, line in enumerate(file):
+                    if number >= start + count:
+                        break
+                    if number >= start:
+                        lines.append(line)
+            record_scan(start + len(lines), 0)
+            return lines
+        offsets, lines = self._text_index()
+        if start >= lines:
+            return []
+        checkpoint = min(start // STRIDE, len(offsets) - 1)
+        position = int(offsets[checkpoint])
+        skip = start - checkpoint * STRIDE
+        lines = []
+        with open(self.path, "rb") as file:
+            file.seek(position)
+            for number, line in enumerate(file):
+                if number >= skip + count:
+                    break
+                if number >= skip:
+                    lines.append(line.decode("utf-8", errors="replace"))
+            record_scan(len(lines), file.tell() - position)
+        return lines
+
+    def _line_count(self) -> int:
+        if not self.compressed:
+            return self._text_index()[1]
+        if "lines" not in self._info:
+            with gzip.open(self.path, "rb") as file:
+                lines = sum(1 for _ in file)
+            record_scan(lines, self.size)
+            self._save_info(lines=lines)
+        return self._info["lines"]
+
+    @property
+    def delimiter(self) -> str:
+        return "," if self.format == "csv" else "\t"
+
+    def _text_columns(self) -> tuple:
+        """(column names, header present) of a text table."""
+        if self._columns is None:
+            sample = "".join(self._lines(0, 20))
+            first = next(csv.reader(io.StringIO(sample), delimiter=self.delimiter), [])
+            if self.format == "bed":
+                header = False
+            elif self.format == "csv":
+                header = True
+            else:
+                try:
+                    header = csv.Sniffer().has_header(sample)
+                except csv.Error:
+                    header = False
+            if header:
+                # pandas writes an unnamed index column with an empty name.
+                names = [name or f"column{number}" for number, name in enumerate(first)]
+            else:
+                names = bed_column_names(len(first))
+            self._columns = (names, header)
+        return self._columns
+
+    def _parse(self, lines: list) -> pd.DataFrame:
+        names, _ = self._text_columns()
+        if not lines:
+            return pd.DataFrame(columns=names)
+        return pd.read_csv(
+            io.StringIO("".join(lines)),
+            sep=self.delimiter,
+            header=None,
+            names=names,
+            index_col=False,
+        )
+
+    # Public interface
+
+    @property
+    def num_rows(self) -> int:
+        if self.format == "parquet":
+            return pq.ParquetFile(self.path).metadata.num_rows
+        if self.format == "feather":
+            reader = self._feather()
+            return sum(
+                reader.get_batch(number).num_rows
+                for number in range(reader.num_record_batches)
+            )
+        lines = self._line_count()
+        return lines - int(self._text_columns()[1])
+
+    def schema(self) -> list:
+        """(column, type) pairs; text types are inferred from the first page."""
+        if self.format == "parquet":
+            schema = pq.ParquetFile(self.path).schema_arrow
+            return [(field.name, str(field.type)) for field in schema]
+        if self.format == "feather":
+            return [(field.name, str(field.type)) for field in self._feather().schema]
+        page = self.page(0, 100)
+        return [(str(name), str(dtype)) for name, dtype in page.dtypes.items()]
+
+    def _feather(self):
+        return pa.ipc.open_file(pa.memory_map(self.path))
+
+    def page(self, offset: int, rows: int) -> pd.DataFrame:
+        """Rows ``offset`` to ``offset + rows``; a negative offset counts
+        from the end."""
+        rows = max(min(rows, MAX_ROWS), 0)
+        if offset < 0:
+            offset = max(self.num_rows + offset, 0)
+        if self.format == "parquet":
+            parquet = pq.ParquetFile(self.path, memory_map=True)
+            tables, first = [], 0
+            for group in range(parquet.num_row_groups):
+                length = parquet.metadata.row_group(group).num_rows
+                if first < offset + rows and first + length > offset:
+                    table = parquet.read_row_group(group)
+                    record_scan(
+                        length, parquet.metadata.row_group(group).total_byte_size
+                    )
+                    lo = max(offset - first, 0)
+                    tables.append(table.slice(lo, offset + rows - first - lo))
+                first += length
+            if not tables:
+                return parquet.schema_arrow.empty_table().to_pandas()
+            return pa.concat_tables(tables).to_pandas()
+        if self.format == "feather":
+            reader = self._feather()
+            batches, first = [], 0
+            for number in range(reader.num_record_batches):
+                batch = reader.get_batch(number)
+                if first < offset + rows and first + batch.num_rows > offset:
+                    lo = max(offset - first, 0)
+                    batches.append(batch.slice(lo, offset + rows - first - lo))
+                first += batch.num_rows
+                if first >= offset + rows:
+                    break
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+            record_scan(table.num_rows, table.nbytes)
+            return table.to_pandas()
+        header = int(self._text_columns()[1])
+        return self._parse(self._lines(offset + header, rows))
+
+    def read_bytes(self, offset: int, count: int) -> bytes:
+        """Raw bytes of the file (decompressed for gzip); a negative offset
+        counts from the end of an uncompressed file."""
+        count = max(min(count, MAX_BYTES), 0)
+        if self.compressed:
+            with gzip.open(self.path, "rb") as file:
+                file.seek(max(offset, 0))
+                return file.read(count)
+        if offset < 0:
+            offset = max(self.size + offset, 0)
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            data = file.read(count)
+        record_scan(0, len(data))
+        return data
+
+    def stats(self) -> pd.DataFrame:
+        """Per-column type, null count, min, max and mean over the whole file."""
+        if self.format == "parquet":
+            return self._parquet_stats()
+        if "stats" not in self._info:
+            stats = ColumnStats()
+            if self.format == "feather":
+                reader = self._feather()
+                for number in range(reader.num_record_batches):
+                    batch = reader.get_batch(number)
+                    record_scan(batch.num_rows, batch.nbytes)
+                    stats.update(batch)
+            else:
+                names, header = self._text_columns()
+                reader = pa_csv.open_csv(
+                    self.path,
+                    read_options=pa_csv.ReadOptions(
+                        column_names=names, skip_rows=int(header)
+                    ),
+                    parse_options=pa_csv.ParseOptions(
+                        delimiter=self.delimiter,
+                        quote_char='"' if self.format == "csv" else False,
+                    ),
+                )
+                for batch in reader:
+                    record_scan(batch.num_rows, batch.nbytes)
+                    stats.update(batch)
+            self._save_info(stats=stats.frame().to_dict(orient="index"))
+        return pd.DataFrame.from_dict(self._info["stats"], orient="index")
+
+    def _parquet_stats(self) -> pd.DataFrame:
+        """Statistics from the Parquet footer; the mean is not stored there."""
+        parquet = pq.ParquetFile(self.path)
+        schema = parquet.schema_arrow
+        rows = {
+            field.name: {"type": str(field.type), "nulls": 0, "min": None, "max": None}
+            for field in schema
+        }
+        names = [
+            parquet.schema.column(i).path for i in range(parquet.metadata.num_columns)
+        ]
+        for group in range(parquet.num_row_groups):
+            row_group = parquet.metadata.row_group(group)
+            for number, name in enumerate(names):
+                if name not in rows:
+                    continue
+                statistics = row_group.column(number).statistics
+                if statistics is None:
+                    continue
+                entry = rows[name]
+                entry["nulls"] += statistics.null_count or 0
+                if statistics.has_min_max:
+                    entry["min"] = (
+                        statistics.min
+                        if entry["min"] is None
+                        else min(entry["min"], statistics.min)
+                    )
+                    entry["max"] = (
+                        statistics.max
+                        if entry["max"] is None
+                        else max(entry["max"], statistics.max)
+                    )
+        return pd.DataFrame.from_dict(rows, orient="index")
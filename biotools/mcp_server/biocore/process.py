@@ -0,0 +1,74 @@
+"""Streaming capture of subprocess output.
+
+Output is read in chunks as the process runs: every byte is spilled to a log
+file, only the last lines are kept in memory, and new lines can be forwarded
+to a callback (e.g. MCP log/progress notifications) while the job runs.
+"""
+
+import asyncio
+import codecs
+from collections import deque
+
+MAX_LINE_CHARS = 10000
+
+
+class LineTail:
+    """Ring buffer of the last ``max_lines`` decoded output lines."""
+
+    def __init__(self, max_lines: int = 200):
+        self.lines = deque(maxlen=max_lines)
+        self.total_lines = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._partial = ""
+
+    def feed(self, chunk: bytes, final: bool = False) -> list:
+        """Add raw output; returns the lines completed by this chunk."""
+        text = self._partial + self._decoder.decode(chunk, final=final)
+        lines = text.split("\n")
+        self._partial = "" if final else lines.pop()
+        lines = [line[:MAX_LINE_CHARS] for line in lines if line or not final]
+        self.lines.extend(lines)
+        self.total_lines += len(lines)
+        return lines
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_lines > len(self.lines)
+
+    def text(self) -> str:
+        return "\n".join(self.lines).strip()
+
+
+async def stream_output(
+    stream: asyncio.StreamReader,
+    log_path: str,
+    tail: LineTail,
+    on_output=None,
+    chunk_size: int = 1 << 16,
+) -> int:
+    """Copy a process stream to ``log_path`` and ``tail`` until EOF.
+
+    Args:
+        stream: The process stdout reader.
+        log_path: File receiving the complete output.
+        tail: Ring buffer receiving the decoded lines.
+        on_output: Optional coroutine function called with
+            (new lines, bytes read so far) after each chunk.
+
+    Returns:
+        The number of bytes read.
+    """
+    total = 0
+    with open(log_path, "wb") as log:
+        while True:
+            chunk = await stream.read(chunk_size)
+            if not chunk:
+                break
+            total += len(chunk)
+            log.write(chunk)
+            log.flush()
+            lines = tail.feed(chunk)
+            if on_output is not None and lines:
+                await on_output(lines, total)
+        tail.feed(b"", final=True)
+    return total
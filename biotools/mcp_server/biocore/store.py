@@ -0,0 +1,335 @@
+"""Resident, memory-mapped expression store.
+
+Every expression source (the gzip CSV matrices and the TCGA feather) is
+converted once into an uncompressed Arrow tensor plus an Arrow IPC label file,
+keyed by the source checksum from the catalog. Tools then read the matrix
+through a memory map, so repeated calls and separate worker processes share
+the same pages from the page cache instead of each parsing and holding a copy.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .catalog import Catalog, read_checked
+from .genes import GeneIndex
+from .metrics import record_scan
+
+DTYPES = ("float64", "float32")
+# Raw matrix bytes per chunk when a whole matrix is streamed out.
+CHUNK_BYTES = 8 << 20
+
+
+def read_expression(path: str) -> pd.DataFrame:
+    """Parse an expression source in its original format (genes x samples)."""
+    if path.endswith(".feather"):
+        return pd.read_feather(path)
+    return pd.read_csv(path, index_col=0)
+
+
+class ExpressionMatrix:
+    """A read-only expression matrix backed by a memory-mapped tensor file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index, metadata = read_labels(f"{path}/labels.arrow")
+        self.columns = pd.Index(metadata["columns"])
+        self.genes = GeneIndex(self.index)
+        self._source, self.values = read_tensor(f"{path}/matrix.tensor")
+
+    @property
+    def shape(self) -> tuple:
+        return self.values.shape
+
+    def frame(self) -> pd.DataFrame:
+        """A DataFrame view over the mapped matrix; nothing is copied."""
+        record_scan(len(self.index), self.values.nbytes)
+        return pd.DataFrame(
+            self.values, index=self.index, columns=self.columns, copy=False
+        )
+
+    def chunks(self, chunk_bytes: int = CHUNK_BYTES):
+        """The whole matrix as DataFrame views over consecutive row blocks."""
+        step = max(chunk_bytes // max(self.values[:1].nbytes, 1), 1)
+        for start in range(0, len(self.index), step):
+            values = self.values[start : start + step]
+            record_scan(len(values), values.nbytes)
+            yield pd.DataFrame(
+                values,
+                index=self.index[start : start + step],
+                columns=self.columns,
+                copy=False,
+            )
+
+    def select(self, genes) -> pd.DataFrame:
+        """The rows of the given genes, in matrix order."""
+        rows = self.genes.rows(genes)
+        record_scan(len(rows), len(rows) * self.values[:1].nbytes)
+        return pd.DataFrame(
+            self.values[rows], index=self.index[rows], columns=self.columns
+        )
+
+
+def publish_dir(tmp_dir: str, final_dir: str):
+    """Move a finished build into place."""
+    try:
+        os.rename(tmp_dir, final_dir)
+    except OSError:
+        # Another worker process finished the same conversion first.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def prune_versions(parent: str, keep: set):
+    """Remove the versions in ``parent`` other than ``keep`` and abandoned
+    builds. Only call this once no live catalog serves the removed versions."""
+    try:
+        names = os.listdir(parent)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name not in keep and (not name.endswith(".tmp") or not pid_alive(name)):
+            shutil.rmtree(f"{parent}/{name}", ignore_errors=True)
+
+
+def pid_alive(tmp_name: str) -> bool:
+    """Whether the process that owns a "<name>.<pid>.tmp" build is running."""
+    try:
+        os.kill(int(tmp_name.split(".")[-2]), 0)
+    except (ValueError, IndexError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_tensor(path: str, values: np.ndarray):
+    with pa.OSFile(path, "wb") as sink:
+        pa.ipc.write_tensor(pa.Tensor.from_numpy(np.ascontiguousarray(values)), sink)
+
+
+def read_tensor(path: str) -> tuple:
+    """Map a tensor file; the returned array is a read-only view of the map."""
+    source = pa.memory_map(path)
+    return source, pa.ipc.read_tensor(source).to_numpy()
+
+
+def write_labels(path: str, index: pd.Index, metadata: dict):
+    labels = pa.table(
+        {"index": pa.array(index.astype(str), pa.string())},
+        metadata={"biotools": json.dumps(metadata)},
+    )
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, labels.schema) as writer:
+            writer.write_table(labels)
+
+
+def read_labels(path: str) -> tuple:
+    with pa.memory_map(path) as source:
+        labels = pa.ipc.open_file(source).read_all()
+    metadata = json.loads(labels.schema.metadata[b"biotools"])
+    index = pd.Index(labels.column("index").to_pylist(), name=metadata["index_name"])
+    return index, metadata
+
+
+class PartitionedMatrix:
+    """A matrix split by column prefix into row-major, memory-mapped partitions.
+
+    Each partition holds the sample columns of one prefix (a TCGA cancer type)
+    for all genes, stored row by row. Selecting a few genes of one cancer
+    therefore only touches those rows of one partition file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index, metadata = read_labels(f"{path}/labels.arrow")
+        self.columns = pd.Index(metadata["columns"])
+        self.genes = GeneIndex(self.index)
+        self.partitions = []
+        for number, positions in enumerate(metadata["partitions"]):
+            source, values = read_tensor(f"{path}/part-{number}.tensor")
+            self.partitions.append((np.asarray(positions), source, values))
+        self._partition_of = np.empty(len(self.columns), dtype=np.int64)
+        self._offset_of = np.empty(len(self.columns), dtype=np.int64)
+        for number, (positions, _, _) in enumerate(self.partitions):
+            self._partition_of[positions] = number
+            self._offset_of[positions] = np.arange(len(positions))
+
+    def _wanted(self, prefix: str) -> np.ndarray:
+        pattern = re.compile(f"^{prefix}")
+        return np.flatnonzero([bool(pattern.search(c)) for c in self.columns])
+
+    def select(
+        self, prefix: str, rows: np.ndarray | slice | None = None
+    ) -> pd.DataFrame:
+        """Read the columns matching ``^prefix`` for the given row positions.
+
+        Args:
+            prefix: Column name prefix (a regular expression, as with
+                ``DataFrame.filter(regex=f"^{prefix}")``).
+            rows: Row positions (or a slice) to read, or None for all rows.
+        """
+        wanted = self._wanted(prefix)
+        index = self.index if rows is None else self.index[rows]
+        blocks, order = [], []
+        for number in np.unique(self._partition_of[wanted]):
+            positions, _, values = self.partitions[number]
+            selected = wanted[self._partition_of[wanted] == number]
+            block = values if rows is None else values[rows]
+            if len(selected) != len(positions):
+                block = block[:, self._offset_of[selected]]
+            blocks.append(block)
+            order.append(selected)
+        if not blocks:
+            return pd.DataFrame(index=index)
+        order = np.concatenate(order)
+        values = np.hstack(blocks) if len(blocks) > 1 else blocks[0]
+        record_scan(len(index), values.nbytes)
+        sort = np.argsort(order, kind="stable")
+        if np.any(sort != np.arange(len(sort))):
+            values = values[:, sort]
+        return pd.DataFrame(
+            values, index=index, columns=self.columns[order[sort]], copy=False
+        )
+
+    def chunks(self, prefix: str, chunk_bytes: int = CHUNK_BYTES):
+        """All rows of the columns matching ``^prefix``, as consecutive row
+        blocks (see ``select``)."""
+        itemsize = self.partitions[0][2].itemsize if self.partitions else 8
+        row_bytes = len(self._wanted(prefix)) * itemsize
+        step = max(chunk_bytes // max(row_bytes, 1), 1)
+        for start in range(0, len(self.index), step):
+            yield self.select(prefix, slice(start, start + step))
+
+
+class ExpressionStore:
+    """Converts catalog expression sources once and serves them memory-mapped.
+
+    Args:
+        store_dir: Writable directory for the converted matrices.
+        catalog: Catalog providing paths and checksums of the sources.
+        dtype: Value type of the stored matrices, "float64" or "float32"
+            (half the memory and I/O, about 7 significant digits).
+    """
+
+    def __init__(self, store_dir: str, catalog: Catalog, dtype: str = "float64"):
+        if dtype not in DTYPES:
+            raise ValueError(
+                f"Expression dtype {dtype} not supported (must be: {', '.join(DTYPES)})"
+            )
+        self.store_dir = store_dir
+        self.catalog = catalog
+        self.dtype = dtype
+        self._lock = threading.RLock()
+        self._matrices = {}
+
+    def version(self, key: str) -> str | None:
+        """Version of a source as served: its checksum, plus the dtype when
+        values are narrowed."""
+        checksum = self.catalog.checksum(key)
+        if checksum is None or self.dtype == "float64":
+            return checksum
+        return f"{checksum}-{self.dtype}"
+
+    def matrix_dir(self, key: str) -> str:
+        return f"{self.store_dir}/{key}/{self.version(key)}"
+
+    def partition_dir(self, key: str, prefixes: list) -> str:
+        layout = hashlib.md5("\t".join(prefixes).encode("utf-8")).hexdigest()[:8]
+        return f"{self.store_dir}/{key}.partitioned/{self.version(key)}-{layout}"
+
+    def build(self, key: str) -> str:
+        """Convert one source into the store unless it is already there."""
+        matrix_dir = self.matrix_dir(key)
+        if os.path.exists(f"{matrix_dir}/labels.arrow"):
+            return matrix_dir
+        with self._lock:
+            if os.path.exists(f"{matrix_dir}/labels.arrow"):
+                return matrix_dir
+            exp = read_checked(
+                self.catalog.path(key), self.catalog.checksum(key), read_expression
+            )
+            tmp_dir = f"{matrix_dir}.{os.getpid()}.tmp"
+            os.makedirs(tmp_dir, exist_ok=True)
+            write_tensor(f"{tmp_dir}/matrix.tensor", exp.to_numpy(dtype=self.dtype))
+            write_labels(
+                f"{tmp_dir}/labels.arrow",
+                exp.index,
+                {
+                    "index_name": exp.index.name,
+                    "columns": [str(column) for column in exp.columns],
+                },
+            )
+            publish_dir(tmp_dir, matrix_dir)
+            return matrix_dir
+
+    def build_partitioned(self, key: str, prefixes: list) -> str:
+        """Split a source by column prefix into row-major partitions.
+
+        A column goes to the longest prefix it starts with; columns matching
+        no prefix share one extra partition.
+        """
+        part_dir = self.partition_dir(key, prefixes)
+        if os.path.exists(f"{part_dir}/labels.arrow"):
+            return part_dir
+        with self._lock:
+            if os.path.exists(f"{part_dir}/labels.arrow"):
+                return part_dir
+            matrix = self.get(key)
+            groups = {}
+            by_length = sorted(prefixes, key=len, reverse=True)
+            for position, column in enumerate(matrix.columns):
+                prefix = next((p for p in by_length if column.startswith(p)), None)
+                groups.setdefault(prefix, []).append(position)
+            tmp_dir = f"{part_dir}.{os.getpid()}.tmp"
+            os.makedirs(tmp_dir, exist_ok=True)
+            partitions = list(groups.values())
+            for number, positions in enumerate(partitions):
+                write_tensor(
+                    f"{tmp_dir}/part-{number}.tensor", matrix.values[:, positions]
+                )
+            write_labels(
+                f"{tmp_dir}/labels.arrow",
+                matrix.index,
+                {
+                    "index_name": matrix.index.name,
+                    "columns": matrix.columns.to_list(),
+                    "partitions": partitions,
+                },
+            )
+            publish_dir(tmp_dir, part_dir)
+            return part_dir
+
+    def get(self, key: str) -> ExpressionMatrix:
+        """The resident matrix of a source, converted on first use."""
+        checksum = self.catalog.checksum(key)
+        if checksum is None:
+            raise KeyError(f"Expression source {key} not found in local database")
+        with self._lock:
+            cached = self._matrices.get(key)
+            if cached is None or cached[0] != checksum:
+                cached = (checksum, ExpressionMatrix(self.build(key)))
+                self._matrices[key] = cached
+            return cached[1]
+
+    def partitioned(self, key: str, prefixes: list) -> PartitionedMatrix:
+        """The prefix-partitioned layout of a source, built on first use."""
+        checksum = self.catalog.checksum(key)
+        if checksum is None:
+            raise KeyError(f"Expression source {key} not found in local database")
+        version = (checksum, tuple(prefixes))
+        with self._lock:
+            cached = self._matrices.get(f"{key}.partitioned")
+            if cached is None or cached[0] != version:
+                cached = (
+                    version,
+                    PartitionedMatrix(self.build_partitioned(key, prefixes)),
+                )
+                self._matrices[f"{key}.partitioned"] = cached
+            return cached[1]
@@ -0,0 +1,189 @@
+"""Precomputed per-gene expression summaries and fast queries over them.
+
+For every group of samples (a TCGA cancer type, or all columns of one
+expression source) the per-gene mean, spread, quantiles, sample count and
+rank are computed once and stored as one memory-mapped tensor of shape
+(groups, statistics, genes). A statistic of one group is then a contiguous
+gene vector, so top-k and threshold queries are a single partial sort or
+comparison over it instead of a pass over the sample matrix.
+"""
+
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .catalog import Catalog
+from .genes import GeneIndex
+from .metrics import record_scan
+from .store import (
+    ExpressionStore,
+    publish_dir,
+    read_labels,
+    read_tensor,
+    write_labels,
+    write_tensor,
+)
+
+STATS = ["mean", "std", "min", "q25", "median", "q75", "max", "samples", "rank"]
+QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+CHUNK_ROWS = 4096
+
+
+def summarize(values: np.ndarray) -> np.ndarray:
+    """Per-row statistics of a genes x samples matrix, in ``STATS`` order.
+
+    Rows are processed in chunks so the temporary sort buffers stay small;
+    NaN values are ignored. ``rank`` is 1 for the highest median.
+    """
+    stats = np.full((len(STATS), values.shape[0]), np.nan)
+    for start in range(0, values.shape[0], CHUNK_ROWS):
+        chunk = np.asarray(values[start : start + CHUNK_ROWS], dtype=np.float64)
+        rows = slice(start, start + len(chunk))
+        samples = np.count_nonzero(~np.isnan(chunk), axis=1)
+        stats[STATS.index("samples"), rows] = samples
+        valid = samples > 0
+        if not valid.any():
+            continue
+        chunk = chunk[valid]
+        index = np.flatnonzero(valid) + start
+        stats[STATS.index("mean"), index] = np.nanmean(chunk, axis=1)
+        stats[STATS.index("std"), index] = np.nanstd(chunk, axis=1)
+        quantiles = np.nanquantile(chunk, QUANTILES, axis=1)
+        for name, row in zip(["min", "q25", "median", "q75", "max"], quantiles):
+            stats[STATS.index(name), index] = row
+    median = stats[STATS.index("median")]
+    order = np.argsort(-np.nan_to_num(median, nan=-np.inf), kind="stable")
+    stats[STATS.index("rank"), order] = np.arange(1, len(order) + 1)
+    return stats
+
+
+class ExpressionSummary:
+    """Read access to the summaries of one expression source."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index, metadata = read_labels(f"{path}/labels.arrow")
+        self.groups = metadata["groups"]
+        self.genes = GeneIndex(self.index)
+        self._source, self.values = read_tensor(f"{path}/summary.tensor")
+
+    def stat(self, group: str, stat: str) -> np.ndarray:
+        """The gene vector of one statistic of one group."""
+        if stat not in STATS:
+            raise ValueError(
+                f"Statistic {stat} not supported (must be: {', '.join(STATS)})"
+            )
+        return self.values[self.groups.index(group), STATS.index(stat)]
+
+    def table(self, group: str, rows: np.ndarray) -> pd.DataFrame:
+        """All statistics of the given gene rows of one group."""
+        values = self.values[self.groups.index(group)][:, rows]
+        record_scan(len(rows), values.nbytes)
+        frame = pd.DataFrame(values.T, index=self.index[rows], columns=STATS)
+        return frame.astype({"samples": "int64", "rank": "int64"})
+
+    def top(self, group: str, stat: str, k: int, ascending: bool = False) -> np.ndarray:
+        """Rows of the k genes with the highest (or lowest) statistic, in order."""
+        values = self.stat(group, stat)
+        # NaN (no samples) sorts last in either direction.
+        keys = np.where(np.isnan(values), np.inf, values if ascending else -values)
+        k = min(k, len(keys))
+        if k == 0:
+            return np.array([], dtype=np.int64)
+        rows = np.argpartition(keys, k - 1)[:k]
+        return rows[np.argsort(keys[rows], kind="stable")]
+
+    def threshold(
+        self, group: str, stat: str, value: float, ascending: bool = False
+    ) -> np.ndarray:
+        """Rows of the genes whose statistic is >= value (<= when ascending),
+        ordered from the most extreme."""
+        values = self.stat(group, stat)
+        with np.errstate(invalid="ignore"):
+            rows = np.flatnonzero(values <= value if ascending else values >= value)
+        order = np.argsort(values[rows] if ascending else -values[rows], kind="stable")
+        return rows[order]
+
+
+class SummaryStore:
+    """Builds and serves the summaries of the catalog's expression sources.
+
+    Args:
+        store_dir: Writable directory for the summaries.
+        catalog: Catalog providing checksums of the sources.
+        expression_store: Store serving the memory-mapped source matrices.
+    """
+
+    def __init__(
+        self, store_dir: str, catalog: Catalog, expression_store: ExpressionStore
+    ):
+        self.store_dir = store_dir
+        self.catalog = catalog
+        self.expression_store = expression_store
+        self._lock = threading.RLock()
+        self._summaries = {}
+        self._thread = None
+
+    def summary_dir(self, key: str, prefixes: list | None) -> str:
+        layout = hashlib.md5("\t".join(prefixes or []).encode("utf-8")).hexdigest()[:8]
+        version = self.expression_store.version(key)
+        return f"{self.store_dir}/{key}/{version}-{layout}"
+
+    def build(self, key: str, prefixes: list | None = None) -> str:
+        """Summarize a source, per column prefix group if ``prefixes`` is given,
+        otherwise over all of its columns as one group named ``key``."""
+        summary_dir = self.summary_dir(key, prefixes)
+        if os.path.exists(f"{summary_dir}/labels.arrow"):
+            return summary_dir
+        with self._lock:
+            if os.path.exists(f"{summary_dir}/labels.arrow"):
+                return summary_dir
+            if prefixes:
+                matrix = self.expression_store.partitioned(key, prefixes)
+                groups = list(prefixes)
+                stats = [summarize(matrix.select(group).to_numpy()) for group in groups]
+            else:
+                matrix = self.expression_store.get(key)
+                groups = [key]
+                stats = [summarize(matrix.values)]
+            tmp_dir = f"{summary_dir}.{os.getpid()}.tmp"
+            os.makedirs(tmp_dir, exist_ok=True)
+            write_tensor(f"{tmp_dir}/summary.tensor", np.stack(stats))
+            write_labels(
+                f"{tmp_dir}/labels.arrow",
+                matrix.index,
+                {"index_name": matrix.index.name, "groups": groups, "stats": STATS},
+            )
+            publish_dir(tmp_dir, summary_dir)
+            return summary_dir
+
+    def get(self, key: str, prefixes: list | None = None) -> ExpressionSummary:
+        """The summaries of a source, built on first use."""
+        if self.catalog.checksum(key) is None:
+            raise KeyError(f"Expression source {key} not found in local database")
+        summary_dir = self.summary_dir(key, prefixes)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None or summary.path != summary_dir:
+                summary = ExpressionSummary(self.build(key, prefixes))
+                self._summaries[key] = summary
+            return summary
+
+    def start(self, sources: dict):
+        """Build the summaries of ``sources`` (key -> prefixes or None) in a
+        background daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            for key, prefixes in sources.items():
+                try:
+                    self.build(key, prefixes)
+                except Exception as e:
+                    print(f"Expression summary build failed for {key}: {e}")
+
+        self._thread = threading.Thread(target=run, name="summaries", daemon=True)
+        self._thread.start()
@@ -0,0 +1,213 @@
+"""Packed columnar store of the TRAPT TR_bed library.
+
+The per-sample TR bed files are packed into one zstd-compressed Parquet file.
+Rows are grouped by TR and sorted by chromosome and start inside each TR, and
+a TR never spans two row groups, so a set of regulators is read with one
+sequential pass over the row groups that contain them. A JSON index records,
+per TR, its row group, its row range and the row range of each chromosome.
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .catalog import Catalog
+from .intervals import read_bed_table
+from .metrics import record_scan
+from .store import publish_dir
+
+ROWS_PER_GROUP = 1 << 20
+
+
+def build_tr_library(
+    tr_data_db: dict, out_dir: str, rows_per_group: int = ROWS_PER_GROUP
+) -> str:
+    """Pack TR bed files into ``out_dir`` unless the library is already there."""
+    if os.path.exists(f"{out_dir}/index.json"):
+        return out_dir
+    tmp_dir = f"{out_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    schema = pa.schema(
+        [
+            ("chrom", pa.string()),
+            ("start", pa.int64()),
+            ("end", pa.int64()),
+            ("_end_sorted", pa.int64()),
+        ]
+    )
+    index, pending, pending_rows = {}, [], 0
+
+    with pq.ParquetWriter(
+        f"{tmp_dir}/library.parquet", schema, compression="zstd"
+    ) as writer:
+
+        def flush():
+            nonlocal pending, pending_rows
+            if pending:
+                table = pa.concat_tables(pending)
+                writer.write_table(table, row_group_size=max(len(table), 1))
+                pending, pending_rows = [], 0
+
+        group = 0
+        for tr in sorted(tr_data_db):
+            try:
+                table = read_bed_table(tr_data_db[tr]).select(["chrom", "start", "end"])
+            except (pa.ArrowInvalid, OSError) as e:
+                print(f"Skipping TR bed {tr_data_db[tr]}: {e}")
+                continue
+            table = table.sort_by([("chrom", "ascending"), ("start", "ascending")])
+            chroms = table.column("chrom").to_numpy(zero_copy_only=False)
+            ends = table.column("end").to_numpy()
+            end_sorted = np.empty_like(ends)
+            bounds = np.concatenate(
+                [[0], np.flatnonzero(chroms[1:] != chroms[:-1]) + 1, [len(chroms)]]
+            )
+            segments = {}
+            for a, b in zip(bounds[:-1], bounds[1:]):
+                if a == b:
+                    continue
+                segments[chroms[a]] = [pending_rows + int(a), pending_rows + int(b)]
+                end_sorted[a:b] = np.sort(ends[a:b])
+            table = table.append_column("_end_sorted", pa.array(end_sorted))
+            index[tr] = {
+                "group": group,
+                "rows": [pending_rows, pending_rows + len(table)],
+                "chroms": segments,
+            }
+            pending.append(table.cast(schema))
+            pending_rows += len(table)
+            if pending_rows >= rows_per_group:
+                flush()
+                group += 1
+        flush()
+    with open(f"{tmp_dir}/index.json", "w", encoding="utf8") as file:
+        json.dump(index, file)
+    publish_dir(tmp_dir, out_dir)
+    return out_dir
+
+
+class TRLibrary:
+    """Read access to a packed TR library."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(f"{path}/index.json", "r", encoding="utf8") as file:
+            self.index = json.load(file)
+
+    def __contains__(self, tr: str) -> bool:
+        return tr in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def scan(self, trs, columns: list | None = None):
+        """Yield (tr, table) for the requested TRs in one pass over the file.
+
+        TRs are yielded in storage order; unknown TRs are skipped.
+        """
+        by_group = {}
+        for tr in dict.fromkeys(trs):
+            if tr in self.index:
+                by_group.setdefault(self.index[tr]["group"], []).append(tr)
+        parquet = pq.ParquetFile(f"{self.path}/library.parquet")
+        for group in sorted(by_group):
+            table = parquet.read_row_group(group, columns=columns)
+            record_scan(
+                table.num_rows, parquet.metadata.row_group(group).total_byte_size
+            )
+            for tr in sorted(by_group[group], key=lambda tr: self.index[tr]["rows"]):
+                a, b = self.index[tr]["rows"]
+                yield tr, table.slice(a, b - a)
+
+    def regions(self, trs) -> pd.DataFrame:
+        """The binding regions of the requested TRs as one BED-like frame."""
+        tables = [
+            table.select(["chrom", "start", "end"]).append_column(
+                "tr", pa.array([tr] * len(table), pa.string())
+            )
+            for tr, table in self.scan(trs, columns=["chrom", "start", "end"])
+        ]
+        if not tables:
+            return pd.DataFrame(columns=["chrom", "start", "end", "tr"])
+        return pa.concat_tables(tables).to_pandas()
+
+    def count(self, trs, chroms, starts, ends) -> dict:
+        """Number of binding regions of each TR overlapping each query region.
+
+        Returns:
+            A dict mapping TR name to an array of counts per query region.
+        """
+        chroms, starts, ends = np.asarray(chroms), np.asarray(starts), np.asarray(ends)
+        queries = {
+            chrom: np.flatnonzero(chroms == chrom) for chrom in pd.unique(chroms)
+        }
+        counts = {}
+        for tr, table in self.scan(trs, columns=["start", "_end_sorted"]):
+            tr_starts = table.column("start").to_numpy()
+            tr_end_sorted = table.column("_end_sorted").to_numpy()
+            offset = self.index[tr]["rows"][0]
+            tr_counts = np.zeros(len(chroms), dtype=np.int64)
+            for chrom, (a, b) in self.index[tr]["chroms"].items():
+                rows = queries.get(chrom)
+                if rows is None:
+                    continue
+                a, b = a - offset, b - offset
+                tr_counts[rows] = np.searchsorted(
+                    tr_starts[a:b], ends[rows], "left"
+                ) - np.searchsorted(tr_end_sorted[a:b], starts[rows], "right")
+            counts[tr] = tr_counts
+        return counts
+
+
+class TRLibraryStore:
+    """Keeps the packed TR library in sync with the catalog's TR index.
+
+    The library is built in a background thread; until it is ready,
+    ``get`` returns None and callers fall back to the per-sample files.
+    """
+
+    def __init__(self, store_dir: str, catalog: Catalog):
+        self.store_dir = store_dir
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._library = None
+        self._thread = None
+
+    def library_dir(self) -> str:
+        return f"{self.store_dir}/{self.catalog.version('tr_bed')}"
+
+    def build(self) -> TRLibrary:
+        with self._lock:
+            library_dir = self.library_dir()
+            if self._library is None or self._library.path != library_dir:
+                os.makedirs(self.store_dir, exist_ok=True)
+                build_tr_library(self.catalog.tr_data_db(), library_dir)
+                self._library = TRLibrary(library_dir)
+            return self._library
+
+    def get(self) -> TRLibrary | None:
+        library = self._library
+        if library is None or library.path != self.library_dir():
+            if not os.path.exists(f"{self.library_dir()}/index.json"):
+                return None
+            return self.build()
+        return library
+
+    def start(self):
+        """Build or load the library in a background daemon thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            try:
+                self.build()
+            except Exception as e:
+                print(f"TR library build failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="tr-library", daemon=True)
+        self._thread.start()
@@ -0,0 +1,81 @@
+"""Background polling of the data tree for added or changed files.
+
+Each poll stages an up-to-date copy of the catalog. When entries changed,
+the stores derived from them are built for the staged versions first, and
+only then is the live catalog switched over. Requests in flight keep the
+matrices and indexes they already opened; later requests map the new ones,
+which are already on disk. A failed build leaves the old versions live and
+is retried on the next poll. Versions are removed from disk only after the
+swap, and only once neither the live catalog nor the one it replaced serves
+them, so workers that have not reloaded the manifest yet can still read them.
+"""
+
+import threading
+import time
+
+from .catalog import Catalog
+
+
+class CatalogWatcher:
+    """Keeps a live catalog in sync with the data tree.
+
+    Args:
+        catalog: The catalog the tools read.
+        rebuild: Callable taking the staged catalog and the changed keys; it
+            builds the derived stores before the swap.
+        interval: Seconds between polls.
+        prune: Optional callable taking a list of catalogs; it removes the
+            store versions none of them serves.
+    """
+
+    def __init__(self, catalog: Catalog, rebuild, interval: float = 60.0, prune=None):
+        self.catalog = catalog
+        self.rebuild = rebuild
+        self.interval = interval
+        self.prune = prune
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def poll(self) -> list:
+        """Re-index the tree, build what changed and swap it in.
+
+        Returns:
+            The catalog keys that changed.
+        """
+        with self._lock:
+            stage, changed = self.catalog.stage()
+            if changed:
+                start = time.perf_counter()
+                self.rebuild(stage, changed)
+                print(
+                    f"Catalog: rebuilt {', '.join(changed)} "
+                    f"in {time.perf_counter() - start:.1f}s"
+                )
+            previous, _ = self.catalog.stage(refresh=False)
+            self.catalog.publish(stage)
+            if self.prune is not None:
+                self.prune([self.catalog, previous])
+            return changed
+
+    def start(self, primary: bool = True):
+        """Poll in a background daemon thread.
+
+        Only one process should rebuild (``primary``); other server workers
+        follow the manifest it publishes.
+        """
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+
+        def run():
+            while True:
+                time.sleep(self.interval)
+                try:
+                    if primary:
+                        self.poll()
+                    else:
+                        self.catalog.reload()
+                except Exception as e:
+                    print(f"Catalog refresh failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="catalog", daemon=True)
+        self._thread.start()
@@ -0,0 +1,85 @@
+"""Pre-forked server workers sharing one listening socket.
+
+The supervisor binds the socket and forks the workers, which accept
+connections from it in turn. Everything loaded before the fork is shared
+copy-on-write, and the data stores are memory-mapped files, so each worker
+adds its own interpreter and request state but no second copy of the data.
+The supervisor itself runs no threads; it only restarts workers that exit
+and forwards SIGINT/SIGTERM to them on shutdown.
+"""
+
+import os
+import signal
+import socket
+import time
+
+# A worker exiting sooner than this after its start counts as a crash.
+MIN_UPTIME = 5.0
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def fork_worker(sock: socket.socket, index: int, serve) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        serve(sock, index)
+    except BaseException as e:
+        print(f"Worker {index} failed: {e}")
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def serve_workers(workers: int, host: str, port: int, serve):
+    """Fork ``workers`` processes running ``serve(sock, index)`` on a shared
+    socket and keep them running until SIGINT or SIGTERM.
+
+    Worker ``index`` is stable across restarts, so ``serve`` can give one
+    worker (e.g. index 0) duties that must run in a single process.
+    """
+    sock = bind_socket(host, port)
+    running = {}  # pid -> (index, start time)
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(running):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for index in range(workers):
+        running[fork_worker(sock, index, serve)] = (index, time.monotonic())
+    print(f"Serving {workers} workers on {host}:{port}")
+
+    while running:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index, started = running.pop(pid, (None, 0.0))
+        if index is None or stopping:
+            continue
+        print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+        if time.monotonic() - started < MIN_UPTIME:
+            # Crashing on startup; don't spin.
+            time.sleep(MIN_UPTIME)
+        if not stopping:
+            running[fork_worker(sock, index, serve)] = (index, time.monotonic())
+    sock.close()
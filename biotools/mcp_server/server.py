@@ -1,20 +1,111 @@
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP
+from fastmcp.server.middleware import Middleware
+import numpy as np
 import pandas as pd
 from typing import Optional
 import os
 import asyncio
+import contextlib
 import hashlib
+import multiprocessing
+import signal
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+import uvicorn
+
+from biocore import (
+    BlockingPool,
+    Catalog,
+    CatalogWatcher,
+    ChipSeqPipeline,
+    ExpressionStore,
+    FilePreview,
+    GeneTable,
+    InterpreterPool,
+    IntervalStore,
+    JobScheduler,
+    LineTail,
+    ResultCache,
+    SummaryStore,
+    TRLibraryStore,
+    category_enrichment,
+    materialize_dir,
+    materialize_manifest,
+    normalize_genes,
+    prune_versions,
+    read_bed_table,
+    read_regions,
+    resolve_format,
+    serve_workers,
+    stream_output,
+    tail_file,
+    top_correlated,
+    total_memory_gb,
+    write_csv,
+    write_frame,
+    write_frames,
+)
+from biocore import metrics
 
 mcp = FastMCP("biotools")
 
 # workdir = "/data/zgr/transagent/biotools/mcp_server"
 # data_docker = "/data/zgr/transagent/biotools/data"
 
-data_docker = "/data"
-workdir = "/app"
-tmp_docker = "/tmp"
+data_docker = os.environ.get("BIOTOOLS_DATA_DIR", "/data")
+workdir = os.environ.get("BIOTOOLS_APP_DIR", "/app")
+tmp_docker = os.environ.get("BIOTOOLS_TMP_DIR", "/tmp")
+cache_docker = f"{tmp_docker}/.biotools"
+# Disk budget for tool output files kept in tmp_docker (GB)
+result_cache_gb = float(os.environ.get("BIOTOOLS_RESULT_CACHE_GB", 50))
+# Minimum seconds between execute_bash output notifications
+execute_bash_notify_interval = 1.0
+# Worker processes for CPU-bound tools (enrichment)
+process_workers = int(os.environ.get("BIOTOOLS_PROCESSES", min(os.cpu_count(), 8)))
+# Upper bound on the shuffled backgrounds of one annotation_enrichment call
+max_shuffles = int(os.environ.get("BIOTOOLS_MAX_SHUFFLES", 10000))
+# Threads running blocking tool bodies, and calls allowed to wait for one
+tool_threads = int(os.environ.get("BIOTOOLS_THREADS", min(os.cpu_count(), 8)))
+tool_queue = int(os.environ.get("BIOTOOLS_THREAD_QUEUE", 32))
+# Resources shared by all background jobs (submit_job)
+job_cpus = int(os.environ.get("BIOTOOLS_JOB_CPUS", os.cpu_count()))
+job_memory_gb = float(os.environ.get("BIOTOOLS_JOB_MEMORY_GB", total_memory_gb()))
+# Server processes sharing the listening socket and the memory-mapped stores;
+# tool threads, enrichment processes and the result cache are per worker
+server_workers = int(os.environ.get("BIOTOOLS_WORKERS", 1))
+# With several workers, worker i serves its own metrics on this port + i
+metrics_port = int(os.environ.get("BIOTOOLS_METRICS_PORT", 3101))
+# Value type of the mapped expression matrices: float64, or float32 for half
+# the memory at about 7 significant digits
+expression_dtype = os.environ.get("BIOTOOLS_EXPRESSION_DTYPE", "float64")
+# Seconds between scans of the data tree for added or changed files (0: off)
+catalog_interval = float(os.environ.get("BIOTOOLS_CATALOG_INTERVAL", 60))
+# Default output_format of table exports: text (csv/bed), tsv.gz, parquet or feather
+default_output_format = os.environ.get("BIOTOOLS_OUTPUT_FORMAT", "text")
+# Checkpoints of the ChIP-seq pipeline stages, reused across runs
+pipeline_dir = os.environ.get("BIOTOOLS_PIPELINE_DIR", f"{tmp_docker}/pipeline")
+# Warm interpreters per language for execute_code, and the libraries they preload
+r_interpreters = int(os.environ.get("BIOTOOLS_R_INTERPRETERS", 2))
+python_interpreters = int(os.environ.get("BIOTOOLS_PYTHON_INTERPRETERS", 2))
+r_preload = os.environ.get(
+    "BIOTOOLS_R_PRELOAD", "ChIPseeker,TxDb.Hsapiens.UCSC.hg38.knownGene,GENIE3"
+)
+python_preload = os.environ.get("BIOTOOLS_PYTHON_PRELOAD", "numpy,pandas")
+# Memory (GB) a snippet's processes may use before it is killed, and that an
+# idle interpreter may grow to before it is replaced
+snippet_memory_gb = float(os.environ.get("BIOTOOLS_SNIPPET_MEMORY_GB", 16))
+interpreter_recycle_gb = float(os.environ.get("BIOTOOLS_INTERPRETER_RECYCLE_GB", 4))
 
-os.chdir(workdir)
+# Enrichment workers come from a forkserver that imports this module as
+# __mp_main__ for its definitions only; the setup that touches the working
+# directory, the manifest and the databases runs in server processes.
+server_process = __name__ != "__mp_main__"
+
+if server_process:
+    os.chdir(workdir)
 
 bed_data_db = {
     "Super_Enhancer_SEdbv2": f"{data_docker}/human/human_Super_Enhancer_SEdbv2.bed",
@@ -30,13 +121,6 @@ bed_data_db = {
     "CRISPR": f"{data_docker}/human/human_CRISPR.bed",
 }
 
-tr_data_db = dict(
-    map(
-        lambda x: (x.split(".")[0], f"{data_docker}/trapt/TR_bed/{x}"),
-        os.listdir(f"{data_docker}/trapt/TR_bed"),
-    )
-)
-
 bed_config = {"gene_bed_path": f"{data_docker}/human/gene.bed"}
 
 gene_expression_TCGA = f"{data_docker}/exp/gene_expression_TCGA.feather"
@@ -49,15 +133,141 @@ exp_data_db = {
     "primary_cell_ENCODE": f"{data_docker}/exp/primary_cell_ENCODE.csv.gz",
 }
 
+# The manifest replaces import-time parsing of the data tree; only stale
+# entries are re-indexed on startup.
+catalog = Catalog(
+    f"{cache_docker}/manifest.json",
+    files={
+        **bed_data_db,
+        "gene_bed": bed_config["gene_bed_path"],
+        "gene_expression_TCGA": gene_expression_TCGA,
+        **exp_data_db,
+    },
+    tr_dir=f"{data_docker}/trapt/TR_bed",
+)
+if server_process:
+    catalog.refresh()
+# Expression sources are converted once and then served memory-mapped.
+expression_store = ExpressionStore(f"{cache_docker}/store", catalog, expression_dtype)
+interval_store = IntervalStore(f"{cache_docker}/intervals", catalog)
+# Packed TR_bed library, built in the background on startup.
+tr_library = TRLibraryStore(f"{cache_docker}/tr_library", catalog)
+# Per-cancer and per-source gene statistics for expression_summary.
+summary_store = SummaryStore(f"{cache_docker}/summaries", catalog, expression_store)
+# Data-heavy tools run here so the event loop keeps serving other clients.
+blocking_pool = BlockingPool(tool_threads, tool_queue)
+# Enrichment processes are forked from a server process without the tool and
+# scheduler threads, which forking this process could leave with held locks.
+process_pool = ProcessPoolExecutor(
+    max_workers=process_workers, mp_context=multiprocessing.get_context("forkserver")
+)
+if server_process:
+    # Identical requests against the same data version reuse earlier outputs.
+    result_cache = ResultCache(
+        f"{cache_docker}/results.sqlite", int(result_cache_gb * 1024**3)
+    )
+    # Long-running commands are queued and started within the job budget.
+    job_scheduler = JobScheduler(
+        f"{cache_docker}/jobs.sqlite", f"{tmp_docker}/jobs", job_cpus, job_memory_gb
+    )
+    # Snippets run in children of warm interpreters with the libraries loaded;
+    # each language has its own threads waiting on its interpreters.
+    interpreter_pools = {
+        language: (
+            InterpreterPool(
+                language,
+                [os.environ.get(variable, default)],
+                [name for name in preload.split(",") if name],
+                size,
+                f"{tmp_docker}/interpreters",
+                int(interpreter_recycle_gb * 1024**3),
+            ),
+            BlockingPool(max(size, 1), tool_queue),
+        )
+        for language, variable, default, preload, size in (
+            ("R", "BIOTOOLS_RSCRIPT", "Rscript", r_preload, r_interpreters),
+            (
+                "python",
+                "BIOTOOLS_PYTHON",
+                "python",
+                python_preload,
+                python_interpreters,
+            ),
+        )
+    }
+    # Pipeline stages run as jobs that wait for their upstream stages.
+    chipseq_pipeline = ChipSeqPipeline(job_scheduler, pipeline_dir)
+    metrics.REGISTRY.gauge(
+        "biotools_blocking_pool_admitted",
+        "Data-heavy tool calls running or waiting for a worker thread.",
+        callback=lambda: {(): blocking_pool.admitted},
+    )
+    metrics.REGISTRY.gauge(
+        "biotools_interpreters",
+        "Warm snippet interpreters by language and state.",
+        ["language", "state"],
+        callback=lambda: {
+            (language, state): n
+            for language, (pool, _) in interpreter_pools.items()
+            for state, n in pool.counts().items()
+        },
+    )
+    metrics.REGISTRY.gauge(
+        "biotools_jobs",
+        "Background jobs by state.",
+        ["state"],
+        callback=lambda: {(state,): n for state, n in job_scheduler.counts().items()},
+    )
+
+
+class ToolMetrics(Middleware):
+    """Latency, outcome and in-flight count of every tool call."""
+
+    async def on_call_tool(self, context, call_next):
+        tool = context.message.name
+        # Unknown names are folded together to keep the label set bounded.
+        if tool not in await mcp.get_tools():
+            tool = "unknown"
+        with metrics.track_tool(tool) as outcome:
+            result = await call_next(context)
+            # Failures answered with a message are marked by the tool itself.
+            if getattr(result, "isError", False):
+                outcome["error"] = True
+            return result
+
+
+mcp.add_middleware(ToolMetrics())
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_route(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(
+        metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 # global list
-with open("cli_prompt.md", "r", encoding="utf8") as file:
+with open(f"{workdir}/cli_prompt.md", "r", encoding="utf8") as file:
     execute_bash_md = file.read()
 
 biological_type_list = ", ".join(list(bed_data_db.keys()))
 data_source_list = ", ".join(list(exp_data_db.keys()))
-cancer_list = ", ".join(
-    pd.read_csv(exp_data_db.get("cancer_TCGA"), index_col=0).columns
-)
+cancer_list = ", ".join(catalog.columns("cancer_TCGA"))
+
+
+def read_gene_bed(path: str) -> GeneTable:
+    gene_bed = pd.read_csv(path, index_col=None, header=None, sep="\t")
+    return GeneTable(gene_bed, 4)
+
+
+def expression_group(group: str) -> tuple:
+    """The source key and column prefixes (None for a whole source) of a
+    TCGA cancer type or data source."""
+    if group in exp_data_db:
+        return group, None
+    if group in catalog.columns("cancer_TCGA"):
+        return "gene_expression_TCGA", catalog.columns("cancer_TCGA")
+    raise ValueError(f"Group {group} not found (must be a cancer type or data source)")
 
 
 @mcp.tool(
@@ -67,10 +277,14 @@ cancer_list = ", ".join(
         Args:
             command: The bash command to execute
             timeout: Timeout time (seconds), None means no timeout
+            tail_lines: Number of last output lines returned; the full output is saved to a log file
     """
 )
 async def execute_bash(
-    command: str = "echo hello!", timeout: Optional[float] = 6000.0
+    ctx: Context,
+    command: str = "echo hello!",
+    timeout: Optional[float] = 6000.0,
+    tail_lines: int = 200,
 ) -> str:
     try:
 
@@ -81,31 +295,402 @@ async def execute_bash(
             command,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT,  # 将 stderr 重定向到 stdout
+            start_new_session=True,
         )
+        log_key = uuid.uuid4().hex
+        log_path = f"{tmp_docker}/execute_bash_{log_key}.log"
+        tail = LineTail(tail_lines)
+        last_sent = 0.0
+
+        async def forward(lines: list, total: int):
+            # Stream output to the client, at most once per notify interval.
+            nonlocal last_sent
+            now = time.monotonic()
+            if now - last_sent < execute_bash_notify_interval:
+                return
+            last_sent = now
+            await ctx.info("\n".join(lines[-20:]), logger_name="execute_bash")
+            await ctx.report_progress(total, message=lines[-1][:200])
+
+        def result(output_str: str) -> str:
+            if tail.truncated:
+                return (
+                    f"... output truncated to the last {len(tail.lines)} of "
+                    f"{tail.total_lines} lines, full log: {log_path}\n{output_str}"
+                )
+            return output_str
 
         try:
             # 读取所有输出（合并 stdout 和 stderr）
-            output, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-            output_str = output.decode("utf-8", errors="replace").strip()
+            await asyncio.wait_for(
+                stream_output(proc.stdout, log_path, tail, forward), timeout=timeout
+            )
+            await proc.wait()
+            output_str = tail.text()
 
             if proc.returncode != 0:
-                return f"Command failed (exit {proc.returncode}):\n{output_str}"
+                return result(f"Command failed (exit {proc.returncode}):\n{output_str}")
 
-            return (
+            return result(
                 output_str
                 if output_str
                 else "Command executed successfully (no output)"
             )
 
         except asyncio.TimeoutError:
-            proc.kill()
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(proc.pid, signal.SIGKILL)
             await proc.wait()
-            return f"Command timed out after {timeout} seconds"
+            return result(
+                f"Command timed out after {timeout} seconds\n{tail.text()}".strip()
+            )
+
+        finally:
+            # Keep the log only when the returned output is incomplete.
+            if tail.truncated:
+                result_cache.store(log_key, log_path)
+            else:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(log_path)
 
     except Exception as e:
+        metrics.record_error()
         return f"Execution error: {str(e)}"
 
 
+@mcp.tool(
+    description=f"""
+    Run an R or Python snippet in a warm interpreter. The libraries are already loaded
+    (R: {r_preload}; Python: {python_preload}), so a snippet such as a ChIPseeker annotation
+    starts immediately instead of loading them as a fresh Rscript would. Each snippet runs in
+    its own child process in the server working directory: variables, options and loaded
+    packages do not carry over between snippets. Printed output and messages are returned.
+
+    Args:
+        language: "R" or "python"
+        code: The snippet source, e.g. the R code of an Rscript -e command
+        timeout: Timeout time (seconds), None means no timeout
+        tail_lines: Number of last output lines returned; the full output is saved to a log file
+
+    Returns:
+        The exit status followed by the last output lines.
+    """
+)
+async def execute_code(
+    language: str,
+    code: str,
+    timeout: Optional[float] = 6000.0,
+    tail_lines: int = 200,
+) -> str:
+    try:
+        if language not in interpreter_pools:
+            metrics.record_error()
+            return f"Language {language} not supported (must be: R, python)"
+        pool, threads = interpreter_pools[language]
+        exit_code, reason, log_path = await threads.run(
+            pool.run,
+            code,
+            os.getcwd(),
+            timeout,
+            int(snippet_memory_gb * 1024**3),
+        )
+        with open(log_path, "rb") as file:
+            total_lines = sum(1 for _ in file)
+        output = tail_file(log_path, tail_lines)
+        if reason is not None:
+            status = f"Snippet killed: {reason}"
+        elif exit_code != 0:
+            status = f"Snippet failed (exit {exit_code})"
+        else:
+            status = "Snippet finished" if output else "Snippet finished (no output)"
+        if total_lines > tail_lines:
+            # Keep the log only when the returned output is incomplete.
+            result_cache.store(os.path.basename(log_path), log_path)
+            status += (
+                f", output truncated to the last {tail_lines} of "
+                f"{total_lines} lines, full log: {log_path}"
+            )
+        else:
+            os.remove(log_path)
+        return f"{status}\n{output}".strip()
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+def format_job(job: dict) -> str:
+    started = job["started"] or time.time()
+    finished = job["finished"] or time.time()
+    lines = [
+        f"Job {job['id']}: {job['state']}",
+        f"Command: {job['command']}",
+        f"Resources: {job['cpus']} CPUs, {job['memory_gb']:g} GB memory, priority {job['priority']}",
+    ]
+    if job["after"]:
+        lines.append(f"After jobs: {job['after']}")
+    if job["state"] == "queued":
+        lines.append(f"Queue position: {job_scheduler.queue_position(job['id'])}")
+    if job["started"]:
+        lines.append(f"Runtime: {finished - started:.0f} seconds")
+    if job["returncode"] is not None:
+        lines.append(f"Exit code: {job['returncode']}")
+    lines.append(f"Log: {job_scheduler.log_path(job['id'])}")
+    return "\n".join(lines)
+
+
+@mcp.tool(
+    description=f"""
+    Submit a long-running bash command (alignment, peak calling, ...) as a background job.
+    Jobs are queued and started, highest priority first, when their CPUs and memory fit in the
+    server budget ({job_cpus} CPUs, {job_memory_gb:.0f} GB), so concurrent sessions do not oversubscribe
+    the machine. Queued and running jobs survive a server restart. Use execute_bash for quick commands.
+
+    Args:
+        command: The bash command to run
+        cpus: Number of CPUs the command uses (e.g. the value passed to --threads)
+        memory_gb: Peak memory the command needs (GB)
+        priority: Higher priority jobs start first
+        cwd: Working directory, defaults to the server working directory
+
+    Returns:
+        The job id, used with job_status, job_output and cancel_job.
+    """
+)
+async def submit_job(
+    command: str,
+    cpus: int = 1,
+    memory_gb: float = 1.0,
+    priority: int = 0,
+    cwd: Optional[str] = None,
+) -> str:
+    try:
+        job_id = job_scheduler.submit(command, cpus, memory_gb, priority, cwd)
+        return (
+            f"Job {job_id} submitted "
+            f"(queue position {job_scheduler.queue_position(job_id)}), "
+            f"log: {job_scheduler.log_path(job_id)}"
+        )
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool()
+async def job_status(job_id: Optional[str] = None, limit: int = 20) -> str:
+    """
+    Get the state of a background job (queued, running, done, failed, cancelled or lost).
+
+    Args:
+        job_id: The job id returned by submit_job, None lists the most recent jobs
+        limit: Number of recent jobs listed when job_id is None
+
+    Returns:
+        The job state, resources, runtime, exit code and log path.
+    """
+    try:
+        if job_id is None:
+            jobs = job_scheduler.recent(limit)
+            return "\n\n".join(format_job(job) for job in jobs) or "No jobs submitted"
+        job = job_scheduler.get(job_id)
+        if job is None:
+            metrics.record_error()
+            return f"Job {job_id} not found"
+        return format_job(job)
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool()
+async def job_output(job_id: str, tail_lines: int = 200) -> str:
+    """
+    Get the last lines of a background job's combined stdout and stderr.
+
+    Args:
+        job_id: The job id returned by submit_job
+        tail_lines: Number of last output lines returned; the full output is in the job log
+
+    Returns:
+        The job state followed by the last output lines.
+    """
+    try:
+        job = job_scheduler.get(job_id)
+        if job is None:
+            metrics.record_error()
+            return f"Job {job_id} not found"
+        log_path = job_scheduler.log_path(job_id)
+        if not os.path.exists(log_path):
+            return f"Job {job_id}: {job['state']} (no output yet)"
+        return f"Job {job_id}: {job['state']}, full log: {log_path}\n" + tail_file(
+            log_path, tail_lines
+        )
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool()
+async def cancel_job(job_id: str) -> str:
+    """
+    Cancel a queued or running background job; a running job's process group is terminated.
+
+    Args:
+        job_id: The job id returned by submit_job
+
+    Returns:
+        Whether the job was cancelled.
+    """
+    try:
+        if job_scheduler.cancel(job_id):
+            return f"Job {job_id} cancelled"
+        job = job_scheduler.get(job_id)
+        if job is None:
+            metrics.record_error()
+            return f"Job {job_id} not found"
+        return f"Job {job_id} already finished: {job['state']}"
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool(
+    description=f"""
+    Run the paired-end ChIP-seq pipeline fastqc + trim_galore -> bowtie2 -> picard MarkDuplicates
+    -> samtools index -> macs2 callpeak / bamCoverage for all samples of a sample sheet, as background
+    jobs. Stages of different samples, and fastqc and trimming, run concurrently within the job
+    budget ({job_cpus} CPUs). Each stage result is checkpointed under a key of its input file
+    contents and parameters: running the same sheet again (e.g. after a failure) only runs the
+    stages that failed or whose inputs or parameters changed. Samples used as another sample's
+    control get no peak calling of their own.
+
+    Args:
+        sample_sheet: CSV or TSV file with columns sample, fastq_1, fastq_2 and optionally control
+            (a sample name of the sheet or a control BAM file); relative paths are relative to the sheet
+        output_dir: Directory receiving <sample>/<stage> links to the stage outputs
+            (e.g. <sample>/macs2/<sample>_peaks.narrowPeak, <sample>/bamCoverage/final.bw)
+        params: Parameter overrides: genome_index (bowtie2 index, default /data/rgtdata/hg38/genome_hg38),
+            genome_size (macs2 -g, default hs), min_quality (trim_galore -q, default 20),
+            qvalue (macs2 -q, default 0.01), bin_size (bamCoverage --binSize, default 1)
+        threads: Threads per stage, e.g. {{"bowtie2": 16, "bamCoverage": 8}}
+        priority: Job priority of the stages
+
+    Returns:
+        The stages per sample, cached or with their job id; follow them with pipeline_status.
+    """
+)
+@blocking_pool.offload
+def run_chipseq_pipeline(
+    sample_sheet: str,
+    output_dir: str,
+    params: Optional[dict] = None,
+    threads: Optional[dict] = None,
+    priority: int = 0,
+) -> str:
+    try:
+        stages = chipseq_pipeline.submit(
+            sample_sheet, output_dir, params, threads, priority
+        )
+        queued = sum(stage["job"] is not None for stage in stages)
+        lines = [
+            f"Pipeline in {output_dir}: {queued} stages queued, "
+            f"{len(stages) - queued} cached"
+        ]
+        for stage in stages:
+            state = f"job {stage['job']}" if stage["job"] else "cached"
+            lines.append(f"{stage['sample']}\t{stage['stage']}\t{state}")
+        return "\n".join(lines)
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool()
+async def pipeline_status(output_dir: str) -> str:
+    """
+    Get the state of every stage of a pipeline started with run_chipseq_pipeline.
+
+    Args:
+        output_dir: The output_dir passed to run_chipseq_pipeline
+
+    Returns:
+        The state (cached, done, queued, running, failed, cancelled) of each sample's stages,
+        with the job id to inspect failed stages with job_output.
+    """
+    try:
+        stages = chipseq_pipeline.status(output_dir)
+        lines = []
+        for stage in stages:
+            job = f" (job {stage['job']})" if stage["job"] else ""
+            lines.append(f"{stage['sample']}\t{stage['stage']}\t{stage['state']}{job}")
+        return "\n".join(lines)
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool()
+@blocking_pool.offload
+def preview_file(
+    path: str,
+    offset: int = 0,
+    rows: int = 20,
+    stats: bool = False,
+    byte_offset: Optional[int] = None,
+    byte_count: int = 4096,
+) -> str:
+    """
+    Preview a BED/CSV/TSV (optionally .gz), Parquet or Feather file: schema, row count and one page of rows, without reading the whole file.
+
+    Args:
+        path: Path of the file, e.g. a result returned by another tool
+        offset: First row of the page (0-based, header excluded); negative values count from the end
+        rows: Number of rows in the page (at most 200)
+        stats: Also return per-column null count, min, max and mean over the whole file
+        byte_offset: If given, return the raw bytes from this offset instead of a row page
+        byte_count: Number of raw bytes returned with byte_offset (at most 65536)
+
+    Returns:
+        The file format, row count and schema, followed by the requested rows or bytes and the column statistics.
+    """
+    try:
+        if not os.path.isfile(path):
+            metrics.record_error()
+            return f"File {path} not found"
+        preview = FilePreview(path, f"{cache_docker}/previews")
+        num_rows = preview.num_rows
+        schema = preview.schema()
+        lines = [
+            f"File: {path} ({preview.format}{', gzip' if preview.compressed else ''}, "
+            f"{preview.size} bytes)",
+            f"Rows: {num_rows}, columns: {len(schema)}",
+            "Schema: " + ", ".join(f"{name} ({dtype})" for name, dtype in schema),
+        ]
+        if byte_offset is not None:
+            data = preview.read_bytes(byte_offset, byte_count)
+            lines.append(f"Bytes {byte_offset}+{len(data)}:")
+            lines.append(data.decode("utf-8", errors="replace"))
+        else:
+            start = max(num_rows + offset, 0) if offset < 0 else offset
+            page = preview.page(start, rows)
+            page.index = range(start, start + len(page))
+            lines.append(f"Rows {start}-{start + len(page)}:")
+            lines.append(page.to_csv(sep="\t").rstrip("\n"))
+        if stats:
+            lines.append("Column stats:")
+            lines.append(preview.stats().to_csv(sep="\t").rstrip("\n"))
+        # Sidecar indexes count against the result cache budget and are
+        # evicted with the tool outputs, least recently used first.
+        key = f"preview_{os.path.basename(preview.sidecar)}"
+        if preview.updated:
+            result_cache.store(key, preview.sidecar)
+        else:
+            result_cache.lookup(key)
+        return "\n".join(lines)
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
 @mcp.tool(
     description=f"""
     Get annotation bed file for a given biological type from the local database (hg38).
@@ -120,11 +705,174 @@ async def execute_bash(
 async def get_annotation_bed(biological_type: str) -> str:
     if biological_type in bed_data_db:
         return bed_data_db[biological_type]
+    metrics.record_error()
     return f"Biological type {biological_type} not found in local database"
 
 
+@mcp.tool(
+    description=f"""
+    Query genomic regions against an annotation bed file from the local database (hg38).
+    Runs in-process on a prebuilt interval index, no bedtools call needed.
+
+    Args:
+        regions: Query regions. Can be either:
+            - Region list (e.g., ['chr17:7661779-7687538'])
+            - Path to a bed file
+        biological_type: Biological types in local database (must be: {biological_type_list})
+        query: Query type. Can be either:
+            - "count": number of overlapping annotations per region
+            - "overlap": all overlapping region/annotation pairs (like bedtools intersect -wa -wb)
+            - "nearest": closest annotation per region and its distance (like bedtools closest -d)
+        limit: Maximum number of result rows returned directly
+
+    Returns:
+        A summary and the result rows. Results longer than limit are also saved to a bed file.
+    """
+)
+@blocking_pool.offload
+def query_annotation_bed(
+    regions: list | str, biological_type: str, query: str = "count", limit: int = 50
+) -> str:
+    try:
+        if biological_type not in bed_data_db:
+            metrics.record_error()
+            return f"Biological type {biological_type} not found in local database"
+        if query not in ("count", "overlap", "nearest"):
+            metrics.record_error()
+            return f"Query {query} not supported (must be: count, overlap, nearest)"
+        regions = read_regions(regions)
+        index = interval_store.get(biological_type)
+        chroms = regions["chrom"].to_numpy()
+        starts = regions["start"].to_numpy()
+        ends = regions["end"].to_numpy()
+        if query == "count":
+            counts = index.count(chroms, starts, ends)
+            result = regions.assign(count=counts)
+            summary = (
+                f"{(counts > 0).sum()} of {len(regions)} regions overlap "
+                f"{biological_type} ({counts.sum()} overlaps)"
+            )
+        elif query == "overlap":
+            query_rows, rows = index.overlap(chroms, starts, ends)
+            result = pd.concat(
+                [
+                    regions.iloc[query_rows].reset_index(drop=True),
+                    index.rows(rows).add_prefix(f"{biological_type}_"),
+                ],
+                axis=1,
+            )
+            summary = (
+                f"{len(result)} overlaps between {len(set(query_rows))} of "
+                f"{len(regions)} regions and {biological_type}"
+            )
+        else:
+            rows, distances = index.nearest(chroms, starts, ends)
+            found = rows >= 0
+            result = pd.concat(
+                [
+                    regions[found].reset_index(drop=True),
+                    index.rows(rows[found]).add_prefix(f"{biological_type}_"),
+                ],
+                axis=1,
+            ).assign(distance=distances[found])
+            summary = (
+                f"Nearest {biological_type} for {found.sum()} of {len(regions)} regions "
+                f"({(distances == 0).sum()} overlapping)"
+            )
+        output = f"{summary}\n{result.head(limit).to_csv(sep="\t", index=False)}"
+        if len(result) > limit:
+            md5_value = result_cache.key(
+                "query_annotation_bed",
+                catalog.version(biological_type),
+                biological_type=biological_type,
+                query=query,
+                regions=hashlib.md5(
+                    pd.util.hash_pandas_object(regions).to_numpy().tobytes()
+                ).hexdigest(),
+            )
+            result_path = result_cache.produce(
+                md5_value,
+                lambda: write_csv(
+                    result,
+                    f"{tmp_docker}/{biological_type}_{query}_md5_{md5_value}.bed",
+                    header=False,
+                    index=False,
+                    sep="\t",
+                ),
+            )
+            output = f"{output}... {len(result) - limit} more rows, full result: {result_path}"
+        return output
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool(
+    description=f"""
+    Overlap and enrichment of one region set against all annotation bed files in the local database (hg38), in a single call.
+    Use this instead of running bedtools once per biological type.
+
+    Args:
+        regions: Query regions. Can be either:
+            - Region list (e.g., ['chr17:7661779-7687538'])
+            - Path to a bed file
+        biological_types: Biological types to test, default all (must be: {biological_type_list})
+        shuffles: Number of shuffled backgrounds for expected overlap, fold enrichment and empirical p-value (0 disables, at most {max_shuffles})
+        seed: Random seed for the shuffled backgrounds
+
+    Returns:
+        A table with one row per biological type: overlapping regions, fraction of regions, total overlaps
+        and, with shuffles, expected regions, fold enrichment and p-value.
+    """
+)
+async def annotation_enrichment(
+    regions: list | str,
+    biological_types: Optional[list] = None,
+    shuffles: int = 0,
+    seed: int = 0,
+) -> str:
+    try:
+        biological_types = biological_types or list(bed_data_db)
+        shuffles = min(shuffles, max_shuffles)
+        for biological_type in biological_types:
+            if biological_type not in bed_data_db:
+                metrics.record_error()
+                return f"Biological type {biological_type} not found in local database"
+        regions = await blocking_pool.run(read_regions, regions)
+        chroms = regions["chrom"].to_numpy()
+        starts = regions["start"].to_numpy()
+        ends = regions["end"].to_numpy()
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    process_pool,
+                    category_enrichment,
+                    catalog.path(biological_type),
+                    interval_store.index_dir(biological_type),
+                    chroms,
+                    starts,
+                    ends,
+                    shuffles,
+                    seed,
+                    catalog.checksum(biological_type),
+                )
+                for biological_type in biological_types
+            ]
+        )
+        table = pd.DataFrame(
+            results, index=pd.Index(biological_types, name="biological_type")
+        )
+        table = table.to_csv(sep="\t", float_format="%.4g")
+        return f"{len(regions)} query regions\n{table}"
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
 @mcp.tool()
-async def get_regulators_bed(trs: Optional[list | str]) -> str:
+@blocking_pool.offload
+def get_regulators_bed(trs: Optional[list | str], mode: str = "link") -> str:
     """
     Get TR binding region bed files for a given TR list from the local database (hg38).
 
@@ -132,6 +880,11 @@ async def get_regulators_bed(trs: Optional[list | str]) -> str:
         trs: Transcriptional regulators. Can be either:
             - A list of TR names from TRAPT prediction (e.g., ['GATA4@Sample_03_0174', 'TBX5@Sample_03_0173'])
             - Path to a CSV file containing TR names (one name per line)
+        mode: How the bed files are provided. Can be either:
+            - "link": a directory of links to the library files (default, treat them as read-only)
+            - "copy": a directory of independent copies
+            - "manifest": a single text file listing the library bed paths
+            - "merged": a single bed file with the regions of all TRs (4th column: TR name)
 
     Returns:
         The paths to the TR binding region bed files.
@@ -140,28 +893,153 @@ async def get_regulators_bed(trs: Optional[list | str]) -> str:
         if type(trs) == str:
             trs = pd.read_csv(trs, header=None).iloc[:, 0].to_list()
         if len(trs) == 0:
+            metrics.record_error()
             return "TR list cannot be empty."
-        tr_beds = []
-        md5_value = hashlib.md5(
-            "get_regulators_bed".join(trs).encode("utf-8")
-        ).hexdigest()
+        if mode not in ("link", "copy", "manifest", "merged"):
+            metrics.record_error()
+            return f"Mode {mode} not supported (must be: link, copy, manifest, merged)"
+        tr_data_db = catalog.tr_data_db()
+        # Each TR once: a repeated name must not be linked over its own link.
+        tr_sources = list(
+            dict.fromkeys(tr_data_db[tr] for tr in trs if tr in tr_data_db)
+        )
+        md5_value = result_cache.key(
+            "get_regulators_bed",
+            catalog.version("tr_bed"),
+            trs=normalize_genes(trs),
+            mode=mode,
+        )
+        if mode == "manifest":
+            manifest_path = result_cache.produce(
+                md5_value,
+                lambda: materialize_manifest(
+                    tr_sources, f"{tmp_docker}/md5_{md5_value}.txt"
+                ),
+            )
+            return f"output manifest file:\n{manifest_path}"
+        if mode == "merged":
+
+            def merge() -> str:
+                library = tr_library.get()
+                if library is not None:
+                    merged = library.regions(trs)
+                else:
+                    merged = pd.concat(
+                        [
+                            read_bed_table(tr_data_db[tr])
+                            .to_pandas()
+                            .iloc[:, :3]
+                            .assign(tr=tr)
+                            for tr in dict.fromkeys(trs)
+                            if tr in tr_data_db
+                        ]
+                    )
+                return write_csv(
+                    merged,
+                    f"{tmp_docker}/md5_{md5_value}.bed",
+                    header=False,
+                    index=False,
+                    sep="\t",
+                )
+
+            merged_path = result_cache.produce(md5_value, merge)
+            return f"output bed file:\n{merged_path}"
+        out_dir = f"{tmp_docker}/md5_{md5_value}"
+
+        def materialize() -> str:
+            materialize_dir(tr_sources, out_dir, mode)
+            return out_dir
+
+        result_cache.produce(md5_value, materialize)
+        tr_beds = [f"{out_dir}/{os.path.basename(src)}" for src in tr_sources]
         output = "output bed files:\n"
-        os.system(f"mkdir /tmp/md5_{md5_value}")
-        for tr in trs:
-            tr_bed = tr_data_db.get(tr)
-            if tr_bed:
-                baseanme = os.path.basename(tr_bed)
-                os.system(f"cp {tr_bed} /tmp/md5_{md5_value}/{baseanme}")
-                tr_beds.append(f"/tmp/md5_{md5_value}/{baseanme}")
         output = f"{output}{"\n".join(tr_beds)}"
         return output
     except Exception as e:
+        metrics.record_error()
         return str(e)
 
 
 @mcp.tool()
-async def get_gene_position(genes: Optional[list | str] = None) -> str:
+@blocking_pool.offload
+def regulator_overlap(
+    regions: list | str, trs: Optional[list | str] = "all", limit: int = 50
+) -> str:
+    """
+    Rank TRs from the local TR binding database (hg38) by how many query regions their binding regions overlap.
+
+    Args:
+        regions: Query regions. Can be either:
+            - Region list (e.g., ['chr17:7661779-7687538'])
+            - Path to a bed file
+        trs: Transcriptional regulators. Can be either:
+            - A list of TR names (e.g., ['GATA4@Sample_03_0174'])
+            - Path to a CSV file containing TR names (one name per line)
+            - The string "all" to test every TR in the database
+        limit: Maximum number of TRs returned directly
+
+    Returns:
+        TRs sorted by overlapping regions. Results longer than limit are also saved to a file.
     """
+    try:
+        library = tr_library.get()
+        if library is None:
+            tr_library.start()
+            metrics.record_error()
+            return "The TR library is still being built, please try again later."
+        if type(trs) == str:
+            if trs == "all":
+                trs = list(library.index)
+            else:
+                trs = pd.read_csv(trs, header=None).iloc[:, 0].to_list()
+        regions = read_regions(regions)
+        counts = library.count(
+            trs,
+            regions["chrom"].to_numpy(),
+            regions["start"].to_numpy(),
+            regions["end"].to_numpy(),
+        )
+        result = pd.DataFrame(
+            {
+                "regions": [(count > 0).sum() for count in counts.values()],
+                "overlaps": [count.sum() for count in counts.values()],
+                "peaks": [
+                    library.index[tr]["rows"][1] - library.index[tr]["rows"][0]
+                    for tr in counts
+                ],
+            },
+            index=pd.Index(list(counts), name="tr"),
+        )
+        result.insert(1, "fraction", result["regions"] / max(len(regions), 1))
+        result = result.sort_values(["regions", "overlaps"], ascending=False)
+        summary = f"{(result['regions'] > 0).sum()} of {len(result)} TRs overlap {len(regions)} query regions"
+        output = (
+            f"{summary}\n{result.head(limit).to_csv(sep="\t", float_format="%.4g")}"
+        )
+        if len(result) > limit:
+            md5_value = result_cache.key(
+                "regulator_overlap",
+                catalog.version("tr_bed"),
+                trs=normalize_genes(trs),
+                regions=hashlib.md5(
+                    pd.util.hash_pandas_object(regions).to_numpy().tobytes()
+                ).hexdigest(),
+            )
+            result_path = result_cache.produce(
+                md5_value,
+                lambda: write_csv(
+                    result, f"{tmp_docker}/regulator_overlap_md5_{md5_value}.csv"
+                ),
+            )
+            output = f"{output}... {len(result) - limit} more rows, full result: {result_path}"
+        return output
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool(
+    description=f"""
     Query the positions of genes and return a Gene-bed file path (hg38).
 
     Args:
@@ -169,30 +1047,47 @@ async def get_gene_position(genes: Optional[list | str] = None) -> str:
             - Gene name list (e.g., ['TP53'])
             - CSV file containing a list of gene names
             - The string "all" to return all genes
+        output_format: Output file format, default {default_output_format}. Can be either:
+            - "text": BED file (no header)
+            - "tsv.gz": gzip-compressed tab-separated text
+            - "parquet": Parquet (zstd), read with pandas.read_parquet / arrow::read_parquet
+            - "feather": Feather/Arrow IPC, read with pandas.read_feather / arrow::read_feather
 
     Returns:
         The path to the gene bed file.
     """
+)
+@blocking_pool.offload
+def get_gene_position(
+    genes: Optional[list | str] = None, output_format: Optional[str] = None
+) -> str:
     try:
+        output_format = resolve_format(output_format or default_output_format, "bed")
         if type(genes) == str and genes != "all":
             genes = pd.read_csv(genes, header=None).iloc[:, 0].to_list()
-        gene_bed = pd.read_csv(
-            bed_config["gene_bed_path"], index_col=None, header=None, sep="\t"
-        )
-        if genes == "all":
-            gene_position = gene_bed
-            genes = ["all"]
-        else:
-            gene_position = gene_bed[gene_bed[4].map(lambda gene: gene in genes)]
-        md5_value = hashlib.md5(
-            "get_gene_position".join(genes).encode("utf-8")
-        ).hexdigest()
-        docker_gene_position_path = f"{tmp_docker}/gene_position_md5_{md5_value}.bed"
-        gene_position.to_csv(
-            docker_gene_position_path, header=False, index=False, sep="\t"
+        md5_value = result_cache.key(
+            "get_gene_position",
+            catalog.version("gene_bed"),
+            genes=normalize_genes(genes),
+            output_format=output_format,
         )
-        return docker_gene_position_path
+
+        def build() -> str:
+            gene_bed = catalog.lazy("gene_bed", read_gene_bed)
+            if genes == "all":
+                gene_position = gene_bed.table()
+            else:
+                gene_position = gene_bed.select(genes)
+            return write_frame(
+                gene_position,
+                f"{tmp_docker}/gene_position_md5_{md5_value}",
+                output_format,
+                bed=True,
+            )
+
+        return result_cache.produce(md5_value, build)
     except Exception as e:
+        metrics.record_error()
         return str(e)
 
 
@@ -206,30 +1101,51 @@ async def get_gene_position(genes: Optional[list | str] = None) -> str:
             - Gene name list (e.g., ['TP53'])
             - CSV file containing a list of gene names
             - The string "all" to return all genes
+        output_format: Output file format, default {default_output_format}. Can be either:
+            - "text": CSV file
+            - "tsv.gz": gzip-compressed tab-separated text
+            - "parquet": Parquet (zstd), read with pandas.read_parquet / arrow::read_parquet
+            - "feather": Feather/Arrow IPC, read with pandas.read_feather / arrow::read_feather
 
     Returns:
         The TCGA cancer genes expression file.
     """
 )
-async def get_tcga_cancer_express(
-    cancer: str, genes: Optional[list | str] = "all"
+@blocking_pool.offload
+def get_tcga_cancer_express(
+    cancer: str,
+    genes: Optional[list | str] = "all",
+    output_format: Optional[str] = None,
 ) -> str:
 
     try:
+        output_format = resolve_format(output_format or default_output_format, "csv")
         if type(genes) == str and genes != "all":
             genes = pd.read_csv(genes, header=None).iloc[:, 0].to_list()
-        exp = pd.read_feather(gene_expression_TCGA)
-        if genes == "all":
-            exp_genes = exp
-            genes = ["all"]
-        else:
-            exp_genes = exp[exp.index.map(lambda gene: gene in genes)]
-        exp_genes = exp_genes.filter(regex=f"^{cancer}")
-        md5_value = hashlib.md5(cancer.join(genes).encode("utf-8")).hexdigest()
-        exp_genes_path = f"{tmp_docker}/TCGA_{cancer}_exp_md5_{md5_value}.csv"
-        exp_genes.to_csv(exp_genes_path)
-        return exp_genes_path
+        md5_value = result_cache.key(
+            "get_tcga_cancer_express",
+            expression_store.version("gene_expression_TCGA"),
+            cancer=cancer,
+            genes=normalize_genes(genes),
+            output_format=output_format,
+        )
+
+        def build() -> str:
+            # Partitioned by cancer type: only the requested rows of one
+            # partition are read from the mapped files.
+            exp = expression_store.partitioned(
+                "gene_expression_TCGA", catalog.columns("cancer_TCGA")
+            )
+            stem = f"{tmp_docker}/TCGA_{cancer}_exp_md5_{md5_value}"
+            if genes == "all":
+                # Streamed in row blocks; the full table is never materialized.
+                return write_frames(exp.chunks(cancer), stem, output_format)
+            exp_genes = exp.select(cancer, exp.genes.rows(genes))
+            return write_frame(exp_genes, stem, output_format)
+
+        return result_cache.produce(md5_value, build)
     except Exception as e:
+        metrics.record_error()
         return str(e)
 
 
@@ -243,33 +1159,341 @@ async def get_tcga_cancer_express(
             - Gene name list (e.g., ['TP53'])
             - CSV file containing a list of gene names
             - The string "all" to return all genes
-    
+        output_format: Output file format, default {default_output_format}. Can be either:
+            - "text": CSV file
+            - "tsv.gz": gzip-compressed tab-separated text
+            - "parquet": Parquet (zstd), read with pandas.read_parquet / arrow::read_parquet
+            - "feather": Feather/Arrow IPC, read with pandas.read_feather / arrow::read_feather
+
     Returns:
         The average gene expression file.
     """
 )
-async def get_mean_express_data(
-    data_source: str, genes: Optional[list | str] = "all"
+@blocking_pool.offload
+def get_mean_express_data(
+    data_source: str,
+    genes: Optional[list | str] = "all",
+    output_format: Optional[str] = None,
 ) -> str:
     try:
+        output_format = resolve_format(output_format or default_output_format, "csv")
         if type(genes) == str and genes != "all":
             genes = pd.read_csv(genes, header=None).iloc[:, 0].to_list()
         if data_source in exp_data_db:
-            exp_file = exp_data_db[data_source]
-            exp = pd.read_csv(exp_file, index_col=0)
-            if genes == "all":
-                exp_genes = exp
-                genes = ["all"]
-            else:
-                exp_genes = exp[exp.index.map(lambda gene: gene in genes)]
-            md5_value = hashlib.md5(data_source.join(genes).encode("utf-8")).hexdigest()
-            exp_genes_path = f"{tmp_docker}/exp_genes_md5_{md5_value}.csv"
-            exp_genes.to_csv(exp_genes_path)
-            return exp_genes_path
+            md5_value = result_cache.key(
+                "get_mean_express_data",
+                expression_store.version(data_source),
+                data_source=data_source,
+                genes=normalize_genes(genes),
+                output_format=output_format,
+            )
+
+            def build() -> str:
+                exp = expression_store.get(data_source)
+                stem = f"{tmp_docker}/exp_genes_md5_{md5_value}"
+                if genes == "all":
+                    return write_frames(exp.chunks(), stem, output_format)
+                return write_frame(exp.select(genes), stem, output_format)
+
+            return result_cache.produce(md5_value, build)
+        metrics.record_error()
         return f"Data source {data_source} not found in local database"
     except Exception as e:
+        metrics.record_error()
         return str(e)
 
 
+@mcp.tool(
+    description=f"""
+    Query precomputed per-gene expression statistics of a TCGA cancer type or a data source, without fetching the expression matrix.
+    Statistics: mean, std, min, q25, median, q75, max, samples (non-missing values) and rank (1 = highest median).
+
+    Args:
+        group: Either a TCGA cancer type (statistics over its TCGA samples, must be: {cancer_list})
+            or a data source (statistics over its columns, must be: {data_source_list})
+        query: Query type. Can be either:
+            - "top": the k genes with the highest stat (lowest with ascending=True)
+            - "threshold": genes whose stat is >= threshold (<= with ascending=True)
+            - "genes": all statistics of the given genes
+        stat: Statistic used by "top" and "threshold" (default median)
+        k: Number of genes for "top"; maximum number of rows returned directly otherwise
+        threshold: Cutoff for "threshold"
+        genes: Gene names for "genes". Can be either:
+            - Gene name list (e.g., ['TP53'])
+            - CSV file containing a list of gene names
+        ascending: Rank from the lowest value instead of the highest
+
+    Returns:
+        A summary and one row of statistics per gene. Results longer than k are also saved to a file.
+    """
+)
+@blocking_pool.offload
+def expression_summary(
+    group: str,
+    query: str = "top",
+    stat: str = "median",
+    k: int = 20,
+    threshold: Optional[float] = None,
+    genes: Optional[list | str] = None,
+    ascending: bool = False,
+) -> str:
+    try:
+        key, prefixes = expression_group(group)
+        summary = summary_store.get(key, prefixes)
+        if query == "top":
+            rows = summary.top(group, stat, k, ascending)
+            description = f"Top {len(rows)} genes by {stat} in {group}"
+        elif query == "threshold":
+            if threshold is None:
+                metrics.record_error()
+                return "A threshold is required for query threshold"
+            rows = summary.threshold(group, stat, threshold, ascending)
+            description = (
+                f"{len(rows)} genes with {stat} {'<=' if ascending else '>='} "
+                f"{threshold} in {group}"
+            )
+        elif query == "genes":
+            if genes is None:
+                metrics.record_error()
+                return "Genes are required for query genes"
+            if type(genes) == str:
+                genes = pd.read_csv(genes, header=None).iloc[:, 0].to_list()
+            rows = summary.genes.rows(genes)
+            description = f"{len(rows)} of {len(set(genes))} genes found in {group}"
+        else:
+            metrics.record_error()
+            return f"Query {query} not supported (must be: top, threshold, genes)"
+        result = summary.table(group, rows)
+        output = (
+            f"{description}\n{result.head(k).to_csv(sep="\t", float_format="%.4g")}"
+        )
+        if len(result) > k:
+            md5_value = result_cache.key(
+                "expression_summary",
+                expression_store.version(key),
+                group=group,
+                query=query,
+                stat=stat,
+                threshold=threshold,
+                genes=normalize_genes(genes) if genes is not None else None,
+                ascending=ascending,
+            )
+            result_path = result_cache.produce(
+                md5_value,
+                lambda: write_csv(
+                    result,
+                    f"{tmp_docker}/expression_summary_md5_{md5_value}.tsv",
+                    sep="\t",
+                ),
+            )
+            output = (
+                f"{output}... {len(result) - k} more rows, full result: {result_path}"
+            )
+        return output
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+@mcp.tool(
+    description=f"""
+    Find the genes most co-expressed with query genes (e.g. a TF list) within a TCGA cancer type or a data source.
+    Computed in-process in seconds; use ARACNe or GENIE3 only when a full network is needed.
+
+    Args:
+        genes: Query gene names, all answered in one pass. Can be either:
+            - Gene name list (e.g., ['TP53', 'MYC'])
+            - CSV file containing a list of gene names
+        group: Either a TCGA cancer type (correlation across its TCGA samples, must be: {cancer_list})
+            or a data source (correlation across its columns, must be: {data_source_list})
+        k: Number of co-expressed genes per query gene
+        method: "pearson" or "spearman"
+        direction: Rank by "positive" correlation, "negative" correlation or "absolute" value
+
+    Returns:
+        The top k genes and correlations per query gene. The full table is also saved to a file.
+    """
+)
+@blocking_pool.offload
+def coexpression(
+    genes: list | str,
+    group: str,
+    k: int = 20,
+    method: str = "pearson",
+    direction: str = "positive",
+) -> str:
+    try:
+        if type(genes) == str:
+            genes = pd.read_csv(genes, header=None).iloc[:, 0].to_list()
+        key, prefixes = expression_group(group)
+        md5_value = result_cache.key(
+            "coexpression",
+            expression_store.version(key),
+            genes=normalize_genes(genes),
+            group=group,
+            k=k,
+            method=method,
+            direction=direction,
+        )
+
+        def build() -> str:
+            if prefixes is None:
+                exp = expression_store.get(key)
+                values = exp.values
+            else:
+                exp = expression_store.partitioned(key, prefixes)
+                values = exp.select(group).to_numpy()
+            query_rows = exp.genes.rows(genes)
+            if len(query_rows) == 0:
+                raise ValueError(f"None of the query genes found in {group}")
+            rows, corr = top_correlated(values, query_rows, k, method, direction)
+            found = rows >= 0
+            result = pd.DataFrame(
+                {
+                    "query": np.repeat(exp.index[query_rows], rows.shape[1])[
+                        found.ravel()
+                    ],
+                    "gene": exp.index[rows[found]],
+                    "correlation": corr[found],
+                    "rank": np.tile(np.arange(1, rows.shape[1] + 1), len(rows))[
+                        found.ravel()
+                    ],
+                }
+            )
+            return write_csv(
+                result,
+                f"{tmp_docker}/coexpression_md5_{md5_value}.tsv",
+                sep="\t",
+                index=False,
+                float_format="%.4g",
+            )
+
+        result_path = result_cache.produce(md5_value, build)
+        result = pd.read_csv(result_path, sep="\t")
+        queries = result["query"].unique()
+        shown = result[result["rank"] <= max(50 // max(len(queries), 1), 5)]
+        output = (
+            f"Top {k} {direction} {method} co-expressed genes of {len(queries)} "
+            f"query genes in {group}\n"
+            f"{shown.to_csv(sep="\t", index=False, float_format="%.4g")}"
+        )
+        if len(shown) < len(result):
+            output = f"{output}... {len(result) - len(shown)} more rows"
+        return f"{output}, full result: {result_path}"
+    except Exception as e:
+        metrics.record_error()
+        return str(e)
+
+
+def start_background():
+    """Start the store builders, cache eviction and the job scheduler."""
+    result_cache.start()
+    tr_library.start()
+    summary_store.start(summary_sources())
+    job_scheduler.start()
+    catalog_watcher.start()
+    start_interpreters()
+
+
+def start_interpreters():
+    for pool, _ in interpreter_pools.values():
+        pool.start()
+
+
+def summary_sources(source: Catalog = catalog) -> dict:
+    return {
+        "gene_expression_TCGA": source.columns("cancer_TCGA"),
+        **{data_source: None for data_source in exp_data_db},
+    }
+
+
+def build_stores(source: Catalog = catalog, keys: list | None = None):
+    """Build the data stores derived from ``keys`` (default: all) of ``source``.
+
+    Run up front before workers fork, so they map the same published files
+    instead of each converting the sources on first use, and by the catalog
+    watcher for a staged catalog before it goes live.
+    """
+    keys = set(source.files) | {"tr_bed"} if keys is None else set(keys)
+    intervals = IntervalStore(interval_store.store_dir, source)
+    expressions = ExpressionStore(expression_store.store_dir, source, expression_dtype)
+    summaries = SummaryStore(summary_store.store_dir, source, expressions)
+    for key in bed_data_db:
+        if key in keys and source.checksum(key) is not None:
+            intervals.build(key)
+    for key, prefixes in summary_sources(source).items():
+        # The TCGA partitions follow the cancer types listed in cancer_TCGA.
+        stale = key in keys or (prefixes is not None and "cancer_TCGA" in keys)
+        if not stale or source.checksum(key) is None:
+            continue
+        if prefixes:
+            expressions.build_partitioned(key, prefixes)
+        else:
+            expressions.build(key)
+        summaries.build(key, prefixes)
+    if "tr_bed" in keys:
+        TRLibraryStore(tr_library.store_dir, source).build()
+
+
+def prune_stores(sources: list):
+    """Remove the store versions that none of the ``sources`` catalogs serves.
+
+    The catalog watcher calls this after a swap with the live catalog and the
+    one it replaced, whose versions other workers may still be reading.
+    """
+    keep = {}
+    for source in sources:
+        intervals = IntervalStore(interval_store.store_dir, source)
+        expressions = ExpressionStore(
+            expression_store.store_dir, source, expression_dtype
+        )
+        summaries = SummaryStore(summary_store.store_dir, source, expressions)
+        dirs = [intervals.index_dir(key) for key in bed_data_db]
+        for key, prefixes in summary_sources(source).items():
+            dirs.append(expressions.matrix_dir(key))
+            if prefixes:
+                dirs.append(expressions.partition_dir(key, prefixes))
+            dirs.append(summaries.summary_dir(key, prefixes))
+        dirs.append(TRLibraryStore(tr_library.store_dir, source).library_dir())
+        for path in dirs:
+            keep.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+    for parent, names in keep.items():
+        prune_versions(parent, names)
+
+
+# Polls the data tree; changed files go live once their stores are built, and
+# the versions they replace are removed one poll later.
+catalog_watcher = CatalogWatcher(
+    catalog, build_stores, catalog_interval, prune=prune_stores
+)
+
+
+def serve_worker(sock, index: int):
+    # Each worker's metrics are its own; label them and serve them apart so
+    # they can be scraped from every worker.
+    metrics.REGISTRY.labels["worker"] = str(index)
+    metrics.serve("0.0.0.0", metrics_port + index)
+    # Worker 0 runs the single-process duties; the job queue and the result
+    # cache are SQLite databases, so all workers submit to and read them.
+    if index == 0:
+        start_background()
+    else:
+        catalog_watcher.start(primary=False)
+        start_interpreters()
+    # Stateless: consecutive requests of a client may reach different workers.
+    app = mcp.http_app(
+        path="/biotools", transport="streamable-http", stateless_http=True
+    )
+    config = uvicorn.Config(app, lifespan="on", timeout_graceful_shutdown=0)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http", host="0.0.0.0", port=3001, path="/biotools")
+    if server_workers > 1:
+        build_stores()
+        serve_workers(server_workers, "0.0.0.0", 3001, serve_worker)
+    else:
+        start_background()
+        mcp.run(
+            transport="streamable-http", host="0.0.0.0", port=3001, path="/biotools"
+        )